@@ -0,0 +1,384 @@
+import uerrno
+import usocket
+import uasyncio as asyncio
+from uasyncio import StreamReader, StreamWriter, IOWrite
+import urequest
+from urequest import DecompIO, HeadBuffer, ResponseHead, IDEMPOTENT, STALE_ERRNOS, absolute_url, build_head, split_url, default_dns, timed_out
+
+#uasyncio counterpart of urequest, the same Response methods are coroutines
+
+
+def wait_writable(s):
+    yield IOWrite(s)
+
+
+async def within(deadline, phase, coro):
+    #Awaits coro, raises a urequest.RequestTimeout once the phase limit passed
+    if deadline is None:
+        return await coro
+    try:
+        return await asyncio.wait_for(coro, deadline.limit(phase))
+    except asyncio.TimeoutError:
+        raise deadline.timeout(phase)
+
+
+async def connect(proto, host, port, dns=default_dns, deadline=None):
+    if deadline is not None:
+        deadline.left()
+    if dns is None:
+        ai = usocket.getaddrinfo(host, port, 0, usocket.SOCK_STREAM)[0]
+    else:
+        ai = dns.resolve(host, port)
+    s = usocket.socket(ai[0], ai[1], ai[2])
+    s.setblocking(False)
+    try:
+        s.connect(ai[-1])
+    except OSError as e:
+        if e.args[0] != uerrno.EINPROGRESS:
+            s.close()
+            if dns is not None:
+                dns.invalidate(host, port)
+            raise
+    try:
+        await within(deadline, "connect", wait_writable(s))
+    except OSError:
+        #Unregisters the socket from the poller and closes it
+        await StreamWriter(s, {}).aclose()
+        if dns is not None:
+            dns.invalidate(host, port)
+        raise
+    if proto == "https:":
+        #The handshake itself still blocks, as in uasyncio.open_connection,
+        #at most for the connect limit
+        import ussl
+        if deadline is None:
+            s.setblocking(True)
+        else:
+            s.settimeout(deadline.limit("connect"))
+        try:
+            s2 = ussl.wrap_socket(s, server_hostname=host)
+        except OSError as e:
+            #The connect wait left the socket in the poller
+            await StreamWriter(s, {}).aclose()
+            if deadline is not None and timed_out(e):
+                raise deadline.timeout("connect")
+            raise
+        s.setblocking(False)
+        return StreamReader(s, s2), StreamWriter(s2, {"raw": s})
+    return StreamReader(s), StreamWriter(s, {})
+
+
+async def aclose(writer):
+    #On https the reader polls the raw socket and the writer writes to its TLS
+    #wrapper, both have to leave the poller
+    await writer.aclose()
+    raw = writer.get_extra_info("raw")
+    if raw is not None:
+        await StreamWriter(raw, {}).aclose()
+
+
+class ConnectionPool(urequest.ConnectionPool):
+
+    #Keep alive connections of the async client, a TLS handshake blocks the
+    #loop so it is only paid once per idle timeout. Entries hold the socket
+    #the reader polls and the (reader, writer) pair
+    def discard(self, s, conn):
+        #Idle sockets are still registered in the uasyncio poller
+        loop = asyncio.get_event_loop()
+        writer = conn[1]
+        loop.remove_writer(writer.s)
+        writer.s.close()
+        if s is not writer.s:
+            loop.remove_writer(s)
+            s.close()
+
+
+default_pool = ConnectionPool()
+
+
+#Inflated bytes produced per step, see Body.top_up
+INFLATE_STEP = 64
+
+
+class Body(urequest.Body):
+
+    #DecompIO reads its input synchronously, so the response tops this buffer
+    #up with awaited reads before each inflate step
+    def refill(self):
+        #A step needed more input than the top up left, e.g. a large block
+        #header. The decoder cannot resume after a short read, so the input
+        #is waited for here, blocking the loop at most for the read limit
+        self.pos = 0
+        self.end = self.response.body_readinto_blocking(self.buf)
+        return self.end
+
+    async def top_up(self):
+        #Keeps half the buffer ahead of the decompressor until the body ends,
+        #enough for most INFLATE_STEP bytes
+        n = self.end - self.pos
+        while n < len(self.buf) // 2:
+            if self.pos:
+                self.buf[:n] = bytes(self.mv[self.pos:self.end])
+                self.pos = 0
+                self.end = n
+            data = await self.response.body_read(len(self.buf) - n)
+            if not data:
+                return
+            self.end = n + len(data)
+            self.buf[n:self.end] = data
+            n = self.end
+
+
+class Response:
+
+    def __init__(self, reader, writer, pool=None, key=None, length=None, chunked=False, deadline=None):
+        self.reader = reader
+        self.writer = writer
+        self.deadline = deadline
+        #When set the connection goes back to the pool if the body was read
+        self.pool = pool
+        self.key = key
+        self.encoding = "utf-8"
+        #Bytes left in the body, or in the current chunk when chunked,
+        #None when the body ends with the connection
+        self.length = 0 if chunked else length
+        self.chunked = chunked
+        self.done = length == 0 and not chunked
+        #Content decoder and its input, set by decompress
+        self.source = None
+        self.decoder = None
+        self.window = 0
+        self.gzip = False
+
+    def decompress(self, window):
+        #gzip body, inflated through a 2**window bytes window
+        self.source = Body(self, 512)
+        self.window = window
+        self.gzip = True
+
+    async def close(self):
+        if self.writer is not None:
+            reader = self.reader
+            writer = self.writer
+            self.writer = None
+            self.reader = None
+            if self.pool is not None and self.done:
+                self.pool.release(self.key, reader.polls, (reader, writer))
+            else:
+                await aclose(writer)
+
+    def chunk_size(self, l):
+        if not l:
+            raise OSError("Connection closed")
+        self.length = int(l.split(b";", 1)[0], 16)
+
+    async def next_chunk(self):
+        l = await within(self.deadline, "read", self.reader.readline())
+        if l == b"\r\n":
+            l = await within(self.deadline, "read", self.reader.readline())
+        self.chunk_size(l)
+        if self.length == 0:
+            while True:
+                l = await within(self.deadline, "read", self.reader.readline())
+                if not l or l == b"\r\n":
+                    break
+            self.done = True
+
+    async def read(self, n=-1):
+        #Up to n body bytes, b"" at the end of the body, the whole body when
+        #n is negative
+        if n < 0:
+            parts = []
+            while True:
+                part = await self.read(512 if self.source is None else INFLATE_STEP)
+                if not part:
+                    break
+                parts.append(part)
+            return b"".join(parts)
+        if self.source is None:
+            return await self.body_read(n)
+        buf = bytearray(n)
+        n = await self.readinto(buf)
+        return bytes(memoryview(buf)[:n])
+
+    async def readinto(self, buf):
+        #Fills buf with up to len(buf) body bytes, returns 0 at the end of
+        #the body
+        if self.source is None:
+            data = await self.body_read(len(buf))
+            buf[: len(data)] = data
+            return len(data)
+        await self.source.top_up()
+        if self.decoder is None:
+            #Reads the gzip header, which the first top up holds
+            self.decoder = DecompIO(self.source, 16 + self.window)
+        if len(buf) > INFLATE_STEP:
+            buf = memoryview(buf)[:INFLATE_STEP]
+        n = self.decoder.readinto(buf)
+        if not n:
+            #Read the gzip trailer too
+            while await self.body_read(512):
+                pass
+            self.source = None
+            self.decoder = None
+        return n or 0
+
+    async def body_read(self, n):
+        #Same as read before content decoding, stops at chunk boundaries
+        if self.reader is None or self.done:
+            return b""
+        if self.length is None:
+            data = await within(self.deadline, "read", self.reader.read(n))
+            if not data:
+                self.done = True
+            return data
+        if self.chunked and self.length == 0:
+            await self.next_chunk()
+            if self.done:
+                return b""
+        if n > self.length:
+            n = self.length
+        data = await within(self.deadline, "read", self.reader.read(n))
+        if not data:
+            raise OSError("Connection closed")
+        self.length -= len(data)
+        if self.length == 0 and not self.chunked:
+            self.done = True
+        return data
+
+    def body_readinto_blocking(self, buf):
+        #body_read outside the event loop, into buf, with the socket blocking
+        #at most for the read limit
+        if self.reader is None or self.done:
+            return 0
+        sock = self.reader.polls
+        if self.deadline is None:
+            sock.setblocking(True)
+        else:
+            sock.settimeout(self.deadline.limit("read"))
+        try:
+            return self.blocking_readinto(self.reader.ios, buf)
+        except OSError as e:
+            if self.deadline is not None and timed_out(e):
+                raise self.deadline.timeout("read")
+            raise
+        finally:
+            sock.setblocking(False)
+
+    def blocking_readinto(self, ios, buf):
+        if self.length is None:
+            n = ios.readinto(buf)
+            if not n:
+                self.done = True
+            return n or 0
+        if self.chunked and self.length == 0:
+            l = ios.readline()
+            if l == b"\r\n":
+                l = ios.readline()
+            self.chunk_size(l)
+            if self.length == 0:
+                while True:
+                    l = ios.readline()
+                    if not l or l == b"\r\n":
+                        break
+                self.done = True
+                return 0
+        n = len(buf)
+        if n > self.length:
+            n = self.length
+        n = ios.readinto(memoryview(buf)[:n])
+        if not n:
+            raise OSError("Connection closed")
+        self.length -= n
+        if self.length == 0 and not self.chunked:
+            self.done = True
+        return n
+
+    async def text(self):
+        return str(await self.read(), self.encoding)
+
+    async def json(self):
+        import ujson
+        return ujson.loads(await self.read())
+
+
+async def request(method, url, data=None, json=None, headers={}, parse_headers=True, pool=default_pool, dns=default_dns, gzip_window=0, deadline=None):
+    #gzip_window (9 to 15) asks for gzip bodies, 0 for identity ones
+    redir_cnt = 1
+    if deadline is not None:
+        deadline.start()
+    gzip = gzip_window and DecompIO is not None
+    if json is not None:
+        assert data is None
+        import ujson
+        data = ujson.dumps(json)
+
+    #Each request owns its head buffer, others run while this one writes
+    h = HeadBuffer(128)
+    while True:
+        proto, host, port, path = split_url(url)
+        key = (proto, host, port)
+
+        conn = None
+        if pool is not None:
+            conn = pool.acquire(key)
+        #Same retry rule as urequest, only for a stale idle connection that
+        #gave nothing back
+        retry = conn is not None and method in IDEMPOTENT
+        if conn is None:
+            reader, writer = await connect(proto, host, port, dns, deadline)
+        else:
+            reader, writer = conn[1]
+
+        head = ResponseHead(parse_headers)
+        l = None
+        try:
+            await writer.awrite(build_head(h, method, host, path, headers, data, json, pool is None, gzip))
+            if data:
+                await writer.awrite(data)
+            l = await within(deadline, "read", reader.readline())
+            if not l:
+                if retry:
+                    #The server dropped the idle connection, retry on a new one
+                    await aclose(writer)
+                    continue
+                raise OSError("Connection closed")
+            head.status_line(l)
+            while head.line(await within(deadline, "read", reader.readline())):
+                pass
+        except OSError as e:
+            await aclose(writer)
+            if retry and l is None and e.args and e.args[0] in STALE_ERRNOS:
+                continue
+            raise
+        except ValueError:
+            await aclose(writer)
+            raise
+
+        if head.location is None:
+            break
+        head.no_body(method)
+        if pool is not None and head.reusable():
+            #Skip the redirect body, the connection goes back to the pool
+            resp = Response(reader, writer, pool, key, head.length, head.chunked, deadline)
+            await resp.read()
+            await resp.close()
+        else:
+            await aclose(writer)
+        if not redir_cnt:
+            raise ValueError("Too many redirects")
+        redir_cnt -= 1
+        url = absolute_url(head.location, proto, host, port)
+
+    head.no_body(method)
+    if pool is None or not head.reusable():
+        resp = Response(reader, writer, None, None, head.length, head.chunked, deadline)
+    else:
+        resp = Response(reader, writer, pool, key, head.length, head.chunked, deadline)
+    if gzip and head.gzip:
+        resp.decompress(gzip_window)
+    resp.status_code = head.status
+    resp.reason = head.reason
+    if head.headers is not None:
+        resp.headers = head.headers
+    return resp
@@ -1,28 +1,433 @@
+import uerrno
 import usocket
+import uselect
+import utime
+try:
+    from uio import IOBase
+except ImportError:
+    IOBase = object
+try:
+    from uzlib import DecompIO
+except ImportError:
+    try:
+        from zlib import DecompIO
+    except ImportError:
+        DecompIO = None
 
 #From pycopylib github
+#Connections are kept alive between requests in a small per host pool
+
+
+class ConnectionPool:
+
+    def __init__(self, max_per_host=2, max_idle=4, idle_timeout=30):
+        self.max_per_host = max_per_host
+        self.max_idle = max_idle
+        self.idle_timeout = idle_timeout
+        #(proto, host, port) -> [(stream, socket, released time)], most
+        #recent last, the stream is the TLS wrapper of the socket on https
+        self.idle = {}
+        self.count = 0
+        self.poller = uselect.poll()
+        self.hits = 0
+        self.misses = 0
+        self.discarded = 0
+
+    def healthy(self, s):
+        #An idle keep alive socket has nothing to read, readable means the
+        #server closed it or sent garbage
+        self.poller.register(s, uselect.POLLIN)
+        try:
+            return not self.poller.poll(0)
+        except OSError:
+            return False
+        finally:
+            self.poller.unregister(s)
+
+    def acquire(self, key):
+        conns = self.idle.get(key)
+        now = utime.time()
+        while conns:
+            s, sock, released = conns.pop()
+            self.count -= 1
+            if now - released < self.idle_timeout and self.healthy(s):
+                self.hits += 1
+                return s, sock
+            self.discarded += 1
+            self.discard(s, sock)
+        self.misses += 1
+        return None
+
+    def release(self, key, s, sock):
+        conns = self.idle.get(key)
+        if conns is None:
+            conns = self.idle[key] = []
+        conns.append((s, sock, utime.time()))
+        self.count += 1
+        if len(conns) > self.max_per_host:
+            self.drop(conns)
+        if self.count > self.max_idle:
+            #Drop the oldest connection among all hosts
+            oldest = None
+            for k in self.idle:
+                c = self.idle[k]
+                if c and (oldest is None or c[0][2] < oldest[0][2]):
+                    oldest = c
+            self.drop(oldest)
+
+    def drop(self, conns):
+        s, sock, released = conns.pop(0)
+        self.count -= 1
+        self.discarded += 1
+        self.discard(s, sock)
+
+    def discard(self, s, sock):
+        s.close()
+
+    def close(self):
+        for k in self.idle:
+            for s, sock, released in self.idle[k]:
+                self.discard(s, sock)
+        self.idle = {}
+        self.count = 0
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "discarded": self.discarded, "idle": self.count}
+
+
+default_pool = ConnectionPool()
+
+
+class RequestTimeout(OSError):
+    #args[0] is the limit that ran out: "connect", "read" or "total"
+    pass
+
+
+#What a socket past its timeout raises, depending on the port
+TIMEOUT_ERRNOS = (uerrno.ETIMEDOUT, uerrno.EAGAIN)
+
+
+class Deadline:
+
+    #Time limits of one request in seconds. connect covers the TCP connect
+    #and the TLS handshake, read any single wait for the server, total the
+    #whole request from DNS to the last body byte
+    def __init__(self, connect=5, read=5, total=15):
+        self.connect = connect
+        self.read = read
+        self.total = total
+        self.end = 0
+
+    def start(self):
+        self.end = utime.ticks_add(utime.ticks_ms(), int(self.total * 1000))
+
+    def left(self):
+        #Seconds before the total deadline, raises once it passed
+        left = utime.ticks_diff(self.end, utime.ticks_ms())
+        if left <= 0:
+            raise RequestTimeout("total")
+        return left / 1000
+
+    def limit(self, phase):
+        #Timeout of the next blocking call of phase
+        limit = self.connect if phase == "connect" else self.read
+        left = self.left()
+        if left < limit:
+            return left
+        return limit
+
+    def arm(self, sock, phase):
+        sock.settimeout(self.limit(phase))
+
+    def timeout(self, phase):
+        #Error for a blocking call of phase that timed out
+        if utime.ticks_diff(self.end, utime.ticks_ms()) <= 0:
+            phase = "total"
+        return RequestTimeout(phase)
+
+
+#Methods sent again when a reused connection turns out stale
+IDEMPOTENT = ("GET", "HEAD", "PUT", "DELETE", "OPTIONS")
+#What writing to or reading from a connection the server closed raises, 32
+#is EPIPE, missing from uerrno on most ports
+STALE_ERRNOS = (uerrno.ECONNRESET, uerrno.ECONNABORTED, 32)
+
+
+def timed_out(e):
+    return isinstance(e, RequestTimeout) or (e.args and e.args[0] in TIMEOUT_ERRNOS)
+
+
+class DnsCache:
+
+    def __init__(self, ttl=300, negative_ttl=30, size=8):
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.size = size
+        #(host, port) -> (address info or None when the lookup failed, expiry)
+        self.entries = {}
+        self.hits = 0
+        self.misses = 0
+        self.negative_hits = 0
+        self.failures = 0
+        self.invalidations = 0
+
+    def resolve(self, host, port):
+        key = (host, port)
+        now = utime.time()
+        entry = self.entries.get(key)
+        if entry is not None and now < entry[1]:
+            if entry[0] is None:
+                self.negative_hits += 1
+                raise OSError("Cached lookup failure for " + host)
+            self.hits += 1
+            return entry[0]
+        self.misses += 1
+        if len(self.entries) >= self.size and key not in self.entries:
+            self.evict(now)
+        try:
+            ai = usocket.getaddrinfo(host, port, 0, usocket.SOCK_STREAM)[0]
+        except (OSError, IndexError):
+            self.failures += 1
+            self.entries[key] = (None, now + self.negative_ttl)
+            raise OSError("Lookup failure for " + host)
+        self.entries[key] = (ai, now + self.ttl)
+        return ai
+
+    def evict(self, now):
+        #Expired entries first, else the one expiring soonest
+        soonest = None
+        for key in self.entries:
+            expiry = self.entries[key][1]
+            if expiry <= now:
+                soonest = key
+                break
+            if soonest is None or expiry < self.entries[soonest][1]:
+                soonest = key
+        del self.entries[soonest]
+
+    def invalidate(self, host, port):
+        if self.entries.pop((host, port), None) is not None:
+            self.invalidations += 1
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "negative_hits": self.negative_hits, "failures": self.failures, "invalidations": self.invalidations, "entries": len(self.entries)}
+
+
+default_dns = DnsCache()
+
+
+class HeadBuffer:
+
+    #Request line and headers are serialized here and sent with one write, so
+    #the head is a single TCP segment and TLS record
+    def __init__(self, size=256):
+        self.buf = bytearray(size)
+        self.pos = 0
+
+    def reset(self):
+        self.pos = 0
+
+    def add(self, data):
+        if isinstance(data, str):
+            data = data.encode()
+        end = self.pos + len(data)
+        if end > len(self.buf):
+            buf = bytearray(max(end, 2 * len(self.buf)))
+            buf[:self.pos] = self.buf[:self.pos]
+            self.buf = buf
+        self.buf[self.pos:end] = data
+        self.pos = end
+
+    def view(self):
+        return memoryview(self.buf)[:self.pos]
+
+
+head_buffer = HeadBuffer()
+
+
+class Body(IOBase):
+
+    #Stream over the transfer decoded body, for the decompressor to read from.
+    #DecompIO pulls its input a byte at a time, the body is read from the
+    #connection in size bytes refills instead
+    def __init__(self, response, size=256):
+        self.response = response
+        self.buf = bytearray(size)
+        self.mv = memoryview(self.buf)
+        self.pos = 0
+        self.end = 0
+
+    def readinto(self, buf):
+        if self.pos == self.end and not self.refill():
+            return 0
+        n = self.end - self.pos
+        if n > len(buf):
+            n = len(buf)
+        buf[:n] = self.mv[self.pos:self.pos + n]
+        self.pos += n
+        return n
+
+    def refill(self):
+        self.pos = 0
+        self.end = self.response.body_readinto(self.buf)
+        return self.end
+
 
 class Response:
 
-    def __init__(self, f):
+    def __init__(self, f, pool=None, key=None, length=None, chunked=False, sock=None, deadline=None):
         self.raw = f
+        #Socket under raw and the request deadline, for timeouts on body reads
+        self.sock = sock
+        self.deadline = deadline
         self.encoding = "utf-8"
         self._cached = None
+        #When set the socket goes back to the pool once the body is read
+        self.pool = pool
+        self.key = key
+        #Bytes left in the body, or in the current chunk when chunked,
+        #None when the body ends with the connection
+        self.length = 0 if chunked else length
+        self.chunked = chunked
+        self.done = length == 0 and not chunked
+        #Content decoder, set by decompress
+        self.decoder = None
+        self.gzip = False
+
+    def decompress(self, window):
+        #gzip body, inflated through a 2**window bytes window
+        self.decoder = DecompIO(Body(self), 16 + window)
+        self.gzip = True
 
     def close(self):
+        self.release()
+        self._cached = None
+
+    def release(self):
         if self.raw:
-            self.raw.close()
+            if self.pool is not None and self.done:
+                self.pool.release(self.key, self.raw, self.sock)
+            else:
+                self.raw.close()
             self.raw = None
-        self._cached = None
+
+    def next_chunk(self):
+        #Chunk size line, the CRLF ending the previous chunk comes first
+        l = self.raw_call(self.raw.readline)
+        if l == b"\r\n":
+            l = self.raw_call(self.raw.readline)
+        if not l:
+            raise OSError("Connection closed")
+        self.length = int(l.split(b";", 1)[0], 16)
+        if self.length == 0:
+            #Last chunk, skip the trailers
+            while True:
+                l = self.raw_call(self.raw.readline)
+                if not l or l == b"\r\n":
+                    break
+            self.done = True
+
+    def readinto(self, buf):
+        #Fills buf with up to len(buf) body bytes, returns 0 at the end of
+        #the body
+        if self.decoder is None:
+            return self.body_readinto(buf)
+        n = self.decoder.readinto(buf)
+        if not n:
+            #Read the gzip trailer too so the connection can be reused
+            while self.body_readinto(buf):
+                pass
+            self.decoder = None
+        return n or 0
+
+    def body_readinto(self, buf):
+        #Same before content decoding, stops at chunk boundaries
+        if self.raw is None or self.done:
+            return 0
+        if self.length is None:
+            n = self.raw_call(self.raw.readinto, buf)
+            if not n:
+                self.done = True
+                self.release()
+            return n or 0
+        if self.chunked and self.length == 0:
+            self.next_chunk()
+            if self.done:
+                self.release()
+                return 0
+        n = len(buf)
+        if n > self.length:
+            n = self.length
+        n = self.raw_call(self.raw.readinto, memoryview(buf)[:n])
+        if not n:
+            raise OSError("Connection closed")
+        self.length -= n
+        if self.length == 0 and not self.chunked:
+            self.done = True
+            self.release()
+        return n
+
+    def raw_call(self, f, *args):
+        #Blocking read on the connection within the request deadline
+        if self.deadline is None:
+            return f(*args)
+        self.deadline.arm(self.sock, "read")
+        try:
+            return f(*args)
+        except OSError as e:
+            if timed_out(e):
+                self.raw.close()
+                self.raw = None
+                raise self.deadline.timeout("read")
+            raise
+
+    def read(self, n=-1):
+        #Up to n body bytes, b"" at the end of the body, the whole body when
+        #n is negative
+        if n < 0:
+            if self.length is None and self.decoder is None:
+                if self.raw is None:
+                    return b""
+                data = self.raw_call(self.raw.read)
+                self.done = True
+                self.release()
+                return data
+            if self.chunked or self.decoder is not None:
+                parts = []
+                for part in self:
+                    parts.append(part)
+                return b"".join(parts)
+            n = self.length
+        buf = bytearray(n)
+        mv = memoryview(buf)
+        pos = 0
+        while pos < n:
+            got = self.readinto(mv[pos:])
+            if not got:
+                break
+            pos += got
+        if pos < n:
+            return bytes(mv[:pos])
+        return bytes(buf)
+
+    def __iter__(self):
+        #Body pieces of at most 512 bytes, never across a transfer chunk
+        #unless decompressed
+        buf = bytearray(512)
+        mv = memoryview(buf)
+        while True:
+            n = self.readinto(buf)
+            if not n:
+                return
+            yield bytes(mv[:n])
 
     @property
     def content(self):
         if self._cached is None:
             try:
-                self._cached = self.raw.read()
+                self._cached = self.read()
             finally:
-                self.raw.close()
-                self.raw = None
+                self.release()
         return self._cached
 
     @property
@@ -34,105 +439,248 @@ class Response:
         return ujson.loads(self.content)
 
 
-def request(method, url, data=None, json=None, headers={}, stream=None, parse_headers=True):
+def connect(proto, host, port, dns=default_dns, deadline=None):
+    #(stream, socket), the stream is the TLS wrapper of the socket on https.
+    #The lookup itself cannot be interrupted, the deadline is checked around it
+    if deadline is not None:
+        deadline.left()
+    if dns is None:
+        ai = usocket.getaddrinfo(host, port, 0, usocket.SOCK_STREAM)[0]
+    else:
+        ai = dns.resolve(host, port)
+    sock = usocket.socket(ai[0], ai[1], ai[2])
+    s = sock
+    try:
+        if deadline is not None:
+            deadline.arm(sock, "connect")
+        try:
+            sock.connect(ai[-1])
+        except OSError:
+            #The host may have moved, look it up again next time
+            if dns is not None:
+                dns.invalidate(host, port)
+            raise
+        if proto == "https:":
+            import ussl
+            if deadline is not None:
+                deadline.arm(sock, "connect")
+            s = ussl.wrap_socket(sock, server_hostname=host)
+    except OSError as e:
+        s.close()
+        if deadline is not None and timed_out(e):
+            raise deadline.timeout("connect")
+        raise
+    return s, sock
+
+
+def split_url(url):
+    try:
+        proto, dummy, host, path = url.split("/", 3)
+    except ValueError:
+        proto, dummy, host = url.split("/", 2)
+        path = ""
+    if proto == "http:":
+        port = 80
+    elif proto == "https:":
+        port = 443
+    else:
+        raise ValueError("Unsupported protocol: " + proto)
+
+    if ":" in host:
+        host, port = host.split(":", 1)
+        port = int(port)
+    return proto, host, port, path
+
+
+def absolute_url(location, proto, host, port):
+    #Redirects may give a path on the same server
+    if location.startswith("/"):
+        return "%s//%s:%d%s" % (proto, host, port, location)
+    return location
+
+
+class ResponseHead:
+
+    #Status line and headers, fed line by line
+    def __init__(self, parse_headers=True):
+        self.parse_headers = parse_headers
+        self.headers = None
+        if parse_headers is not False:
+            self.headers = {}
+        self.status = 0
+        self.reason = ""
+        self.keep_alive = False
+        self.length = None
+        self.chunked = False
+        self.gzip = False
+        self.location = None
+
+    def status_line(self, l):
+        #print(l)
+        l = l.split(None, 2)
+        self.status = int(l[1])
+        if len(l) > 2:
+            self.reason = l[2].rstrip()
+        #HTTP/1.1 connections stay open unless the server says otherwise
+        self.keep_alive = l[0] == b"HTTP/1.1"
+
+    def line(self, l):
+        #False once the head is over
+        if not l or l == b"\r\n":
+            return False
+        #print(l)
+        lk = l.lower()
+
+        if lk.startswith(b"transfer-encoding:"):
+            self.chunked = b"chunked" in lk
+        elif lk.startswith(b"content-length:"):
+            self.length = int(l[15:])
+        elif lk.startswith(b"content-encoding:"):
+            self.gzip = b"gzip" in lk
+        elif lk.startswith(b"connection:"):
+            if b"close" in lk:
+                self.keep_alive = False
+            elif b"keep-alive" in lk:
+                self.keep_alive = True
+        elif lk.startswith(b"location:") and 300 <= self.status <= 399:
+            #The rest of the head is still read, the connection may be reused
+            self.location = l[9:].decode().strip()
+            #print("redir to:", self.location)
+
+        if self.parse_headers is False:
+            pass
+        elif self.parse_headers is True:
+            l = l.decode()
+            k, v = l.split(":", 1)
+            self.headers[k] = v.strip()
+        else:
+            self.parse_headers(l, self.headers)
+        return True
+
+    def no_body(self, method):
+        if method == "HEAD" or self.status == 204 or self.status == 304:
+            self.length = 0
+            self.chunked = False
+            self.gzip = False
+
+    def reusable(self):
+        return self.keep_alive and (self.length is not None or self.chunked)
+
+
+def build_head(h, method, host, path, headers, data, json, close, gzip=False):
+    h.reset()
+    h.add(method)
+    h.add(b" /")
+    h.add(path)
+    h.add(b" HTTP/1.1\r\n")
+    if not "Host" in headers:
+        h.add(b"Host: ")
+        h.add(host)
+        h.add(b"\r\n")
+    # Iterate over keys to avoid tuple alloc
+    for k in headers:
+        h.add(k)
+        h.add(b": ")
+        h.add(headers[k])
+        h.add(b"\r\n")
+    if json is not None:
+        h.add(b"Content-Type: application/json\r\n")
+    if data:
+        h.add(b"Content-Length: %d\r\n" % len(data))
+    if gzip:
+        h.add(b"Accept-Encoding: gzip\r\n")
+    if close:
+        h.add(b"Connection: close\r\n")
+    h.add(b"\r\n")
+    return h.view()
+
+
+def request(method, url, data=None, json=None, headers={}, stream=None, parse_headers=True, pool=default_pool, dns=default_dns, gzip_window=0, deadline=None):
+    #gzip_window (9 to 15) asks for gzip bodies, 0 for identity ones
     redir_cnt = 1
+    if deadline is not None:
+        deadline.start()
+    gzip = gzip_window and DecompIO is not None
     if json is not None:
         assert data is None
         import ujson
         data = ujson.dumps(json)
 
     while True:
-        try:
-            proto, dummy, host, path = url.split("/", 3)
-        except ValueError:
-            proto, dummy, host = url.split("/", 2)
-            path = ""
-        if proto == "http:":
-            port = 80
-        elif proto == "https:":
-            import ussl
-            port = 443
-        else:
-            raise ValueError("Unsupported protocol: " + proto)
-
-        if ":" in host:
-            host, port = host.split(":", 1)
-            port = int(port)
+        proto, host, port, path = split_url(url)
+        key = (proto, host, port)
 
-        ai = usocket.getaddrinfo(host, port, 0, usocket.SOCK_STREAM)
-        ai = ai[0]
-
-        resp_d = None
-        if parse_headers is not False:
-            resp_d = {}
+        conn = None
+        if pool is not None:
+            conn = pool.acquire(key)
+        #Only a stale idle connection that gave nothing back is worth a retry,
+        #the server may have acted on anything else
+        retry = conn is not None and method in IDEMPOTENT
+        if conn is None:
+            conn = connect(proto, host, port, dns, deadline)
+        s, sock = conn
+        if deadline is None:
+            sock.settimeout(None)
 
-        s = usocket.socket(ai[0], ai[1], ai[2])
+        head = ResponseHead(parse_headers)
+        l = None
         try:
-            s.connect(ai[-1])
-            if proto == "https:":
-                s = ussl.wrap_socket(s, server_hostname=host)
-            s.write(b"%s /%s HTTP/1.0\r\n" % (method, path))
-            if not "Host" in headers:
-                s.write(b"Host: %s\r\n" % host)
-            # Iterate over keys to avoid tuple alloc
-            for k in headers:
-                s.write(k)
-                s.write(b": ")
-                s.write(headers[k])
-                s.write(b"\r\n")
-            if json is not None:
-                s.write(b"Content-Type: application/json\r\n")
-            if data:
-                s.write(b"Content-Length: %d\r\n" % len(data))
-            s.write(b"Connection: close\r\n\r\n")
+            if deadline is not None:
+                deadline.arm(sock, "read")
+            s.write(build_head(head_buffer, method, host, path, headers, data, json, pool is None, gzip))
             if data:
                 s.write(data)
 
             l = s.readline()
-            #print(l)
-            l = l.split(None, 2)
-            status = int(l[1])
-            reason = ""
-            if len(l) > 2:
-                reason = l[2].rstrip()
+            if not l:
+                if retry:
+                    #The server dropped the idle connection, retry on a new one
+                    s.close()
+                    continue
+                raise OSError("Connection closed")
+            head.status_line(l)
             while True:
-                l = s.readline()
-                if not l or l == b"\r\n":
-                    break
-                #print(l)
-
-                if l.startswith(b"Transfer-Encoding:"):
-                    if b"chunked" in l:
-                        raise ValueError("Unsupported " + l)
-                elif l.startswith(b"Location:") and 300 <= status <= 399:
-                    if not redir_cnt:
-                        raise ValueError("Too many redirects")
-                    redir_cnt -= 1
-                    url = l[9:].decode().strip()
-                    #print("redir to:", url)
-                    status = 300
+                if deadline is not None:
+                    deadline.arm(sock, "read")
+                if not head.line(s.readline()):
                     break
-
-                if parse_headers is False:
-                    pass
-                elif parse_headers is True:
-                    l = l.decode()
-                    k, v = l.split(":", 1)
-                    resp_d[k] = v.strip()
-                else:
-                    parse_headers(l, resp_d)
-        except OSError:
+        except OSError as e:
+            s.close()
+            if deadline is not None and timed_out(e):
+                raise deadline.timeout("read")
+            if retry and l is None and e.args and e.args[0] in STALE_ERRNOS:
+                continue
+            raise
+        except ValueError:
             s.close()
             raise
 
-        if status != 300:
+        if head.location is None:
             break
+        head.no_body(method)
+        if pool is not None and head.reusable():
+            #Skip the redirect body, the connection goes back to the pool
+            resp = Response(s, pool, key, head.length, head.chunked, sock, deadline)
+            resp.read()
+            resp.release()
+        else:
+            s.close()
+        if not redir_cnt:
+            raise ValueError("Too many redirects")
+        redir_cnt -= 1
+        url = absolute_url(head.location, proto, host, port)
 
-    resp = Response(s)
-    resp.status_code = status
-    resp.reason = reason
-    if resp_d is not None:
-        resp.headers = resp_d
+    head.no_body(method)
+    if pool is None or not head.reusable():
+        resp = Response(s, None, None, head.length, head.chunked, sock, deadline)
+    else:
+        resp = Response(s, pool, key, head.length, head.chunked, sock, deadline)
+    if gzip and head.gzip:
+        resp.decompress(gzip_window)
+    resp.status_code = head.status
+    resp.reason = head.reason
+    if head.headers is not None:
+        resp.headers = head.headers
     return resp
 
 
@@ -152,4 +700,4 @@ def patch(url, **kw):
     return request("PATCH", url, **kw)
 
 def delete(url, **kw):
-    return request("DELETE", url, **kw)
\ No newline at end of file
+    return request("DELETE", url, **kw)
@@ -0,0 +1,54 @@
+# Generated by Tools/compile_assets.py from Tools/assets, do not edit
+
+# Sprites, name -> (width, height, MONO_HMSB rows)
+SPRITES = {
+    "celcius": (6, 7, b"\x06\x01\x01\x06\x00\x00\x00"),
+    "check": (6, 7, b"\x20\x20\x30\x10\x1b\x0e\x0c"),
+    "clear": (6, 7, b"\x1e\x3f\x3f\x3f\x3f\x1e\x00"),
+    "clouds": (6, 7, b"\x1c\x3e\x3e\x23\x21\x21\x1e"),
+    "cross": (6, 7, b"\x21\x33\x1e\x0c\x1e\x33\x21"),
+    "mist": (6, 7, b"\x1e\x3f\x3f\x1e\x38\x07\x38"),
+    "rain": (6, 7, b"\x1e\x3f\x3f\x1e\x12\x24\x12"),
+    "snow": (6, 7, b"\x1e\x3f\x3f\x1e\x15\x2a\x15"),
+    "thunder": (6, 7, b"\x1e\x3f\x3f\x1e\x08\x0c\x04"),
+    "up_arrow": (6, 7, b"\x0c\x1e\x3f\x0c\x0c\x0c\x0c"),
+}
+
+# Fonts in the Sources/font.py layout
+FONTS = {
+    "clock": (
+        b"\x41\x46\x01\x10\x20\x1b\x00\x00\x74\x00\x04\x00\x00\x00\x00\x00"
+        b"\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00"
+        b"\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00"
+        b"\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x84\x00\x06\x00"
+        b"\x94\x00\x02\x00\xa4\x00\x06\x00\xb4\x00\x0a\x00\xd4\x00\x0a\x00"
+        b"\xf4\x00\x0a\x00\x14\x01\x0a\x00\x34\x01\x0a\x00\x54\x01\x0a\x00"
+        b"\x74\x01\x0a\x00\x94\x01\x0a\x00\xb4\x01\x0a\x00\xd4\x01\x0a\x00"
+        b"\xf4\x01\x02\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00"
+        b"\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x0c\x0c\x00\x00\x00"
+        b"\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00"
+        b"\x00\x00\x03\x03\x20\x20\x20\x10\x10\x10\x08\x08\x04\x04\x04\x02"
+        b"\x02\x02\x01\x01\xfc\x00\xfc\x00\x03\x03\x03\x03\x03\x03\x03\x03"
+        b"\x03\x03\x00\x00\x00\x00\x03\x03\x03\x03\x03\x03\x03\x03\x03\x03"
+        b"\xfc\x00\xfc\x00\x00\x00\x00\x00\x00\x03\x00\x03\x00\x03\x00\x03"
+        b"\x00\x03\x00\x00\x00\x00\x00\x03\x00\x03\x00\x03\x00\x03\x00\x03"
+        b"\x00\x00\x00\x00\xfc\x00\xfc\x00\x00\x03\x00\x03\x00\x03\x00\x03"
+        b"\x00\x03\xfc\x00\xfc\x00\x03\x00\x03\x00\x03\x00\x03\x00\x03\x00"
+        b"\xfc\x00\xfc\x00\xfc\x00\xfc\x00\x00\x03\x00\x03\x00\x03\x00\x03"
+        b"\x00\x03\xfc\x00\xfc\x00\x00\x03\x00\x03\x00\x03\x00\x03\x00\x03"
+        b"\xfc\x00\xfc\x00\x00\x00\x00\x00\x03\x03\x03\x03\x03\x03\x03\x03"
+        b"\x03\x03\xfc\x00\xfc\x00\x00\x03\x00\x03\x00\x03\x00\x03\x00\x03"
+        b"\x00\x00\x00\x00\xfc\x00\xfc\x00\x03\x00\x03\x00\x03\x00\x03\x00"
+        b"\x03\x00\xfc\x00\xfc\x00\x00\x03\x00\x03\x00\x03\x00\x03\x00\x03"
+        b"\xfc\x00\xfc\x00\xfc\x00\xfc\x00\x03\x00\x03\x00\x03\x00\x03\x00"
+        b"\x03\x00\xfc\x00\xfc\x00\x03\x03\x03\x03\x03\x03\x03\x03\x03\x03"
+        b"\xfc\x00\xfc\x00\xfc\x00\xfc\x00\x00\x03\x00\x03\x00\x03\x00\x03"
+        b"\x00\x03\x00\x00\x00\x00\x00\x03\x00\x03\x00\x03\x00\x03\x00\x03"
+        b"\x00\x00\x00\x00\xfc\x00\xfc\x00\x03\x03\x03\x03\x03\x03\x03\x03"
+        b"\x03\x03\xfc\x00\xfc\x00\x03\x03\x03\x03\x03\x03\x03\x03\x03\x03"
+        b"\xfc\x00\xfc\x00\xfc\x00\xfc\x00\x03\x03\x03\x03\x03\x03\x03\x03"
+        b"\x03\x03\xfc\x00\xfc\x00\x00\x03\x00\x03\x00\x03\x00\x03\x00\x03"
+        b"\xfc\x00\xfc\x00\x00\x00\x00\x00\x03\x03\x00\x00\x00\x00\x03\x03"
+        b"\x00\x00\x00\x00"
+    ),
+}
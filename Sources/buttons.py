@@ -0,0 +1,91 @@
+# Libs
+import machine
+import uasyncio as asyncio
+import utime
+
+# Event kinds, an event is stored as button index << 1 | kind
+BUTTON_RELEASED = 0
+BUTTON_PRESSED = 1
+
+
+class Buttons:
+    # Active low push buttons. A pin edge IRQ only arms a one shot debounce
+    # timer, the timer callback reads the settled levels and pushes the changes
+    # into a preallocated ring buffer, so the IRQ path never allocates.
+    def __init__(self, pins, debounce_ms=20, size=16, timer_id=0):
+        self.debounce_ms = debounce_ms
+        self.pins = []
+        for number in pins:
+            self.pins.append(machine.Pin(number, machine.Pin.IN, machine.Pin.PULL_UP))
+        self.states = bytearray(len(self.pins))
+        self.ring = bytearray(size)
+        self.head = 0
+        self.tail = 0
+        self.dropped = 0
+        self.debouncing = False
+        self.timer = machine.Timer(timer_id)
+        # Bound methods are allocated on access, keep one for the IRQs
+        self.edge_handler = self.on_edge
+        self.timer_handler = self.on_timer
+        for pin in self.pins:
+            pin.irq(
+                trigger=machine.Pin.IRQ_FALLING | machine.Pin.IRQ_RISING,
+                handler=self.edge_handler,
+            )
+
+    def on_edge(self, pin):
+        if not self.debouncing:
+            self.debouncing = True
+            self.timer.init(
+                mode=machine.Timer.ONE_SHOT,
+                period=self.debounce_ms,
+                callback=self.timer_handler,
+            )
+
+    def on_timer(self, timer):
+        self.debouncing = False
+        for index in range(len(self.pins)):
+            pressed = 0 if self.pins[index].value() else 1
+            if pressed != self.states[index]:
+                self.states[index] = pressed
+                self.push(index << 1 | pressed)
+
+    def push(self, event):
+        head = (self.head + 1) % len(self.ring)
+        if head == self.tail:
+            # Full, the consumer is late
+            self.dropped += 1
+            return
+        self.ring[self.head] = event
+        self.head = head
+
+    def pending(self):
+        return self.head != self.tail
+
+    def get(self):
+        # (button index, BUTTON_PRESSED or BUTTON_RELEASED), None when empty
+        if self.head == self.tail:
+            return None
+        event = self.ring[self.tail]
+        self.tail = (self.tail + 1) % len(self.ring)
+        return event >> 1, event & 1
+
+    def wait(self, timeout_ms):
+        # Idle up to timeout_ms but return as soon as an event is queued. Each
+        # idle lasts until the next interrupt, the button timer included, so
+        # the CPU is clock gated in between instead of polling the ring
+        start = utime.ticks_ms()
+        while not self.pending():
+            if utime.ticks_diff(utime.ticks_ms(), start) >= timeout_ms:
+                return False
+            machine.idle()
+        return True
+
+    async def events(self, handler, poll_ms=5):
+        # uasyncio consumer, calls handler(index, kind) for every event
+        while True:
+            event = self.get()
+            if event is None:
+                await asyncio.sleep_ms(poll_ms)
+            else:
+                handler(event[0], event[1])
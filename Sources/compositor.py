@@ -0,0 +1,89 @@
+# Layers, drawn from the lowest to the highest
+LAYER_BACKGROUND = 0
+LAYER_CONTENT = 1
+LAYER_MODAL = 2
+
+
+class Compositor:
+    # Keeps every displayed segment with its layer and recomposes only the
+    # zones touched by a change, so removing a popup restores what was under it.
+    # The target gives the framebuf drawn into, its size and mark_dirty.
+    def __init__(self, target):
+        self.target = target
+        self.elements = {}
+        # name -> (layer, insertion order), segments may be shared by targets
+        self.z = {}
+        self.order = 0
+        # Spatial index, names of the segments touching each 8 pixel band
+        self.bands = [set() for _ in range(target.height // 8)]
+
+    def band_range(self, y, height):
+        start = max(y, 0) // 8
+        end = min((y + height - 1) // 8, len(self.bands) - 1)
+        return range(start, end + 1)
+
+    def add(self, name, segment, layer):
+        self.z[name] = (layer, self.order)
+        self.order += 1
+        self.elements[name] = segment
+        for band in self.band_range(segment.y, segment.height):
+            self.bands[band].add(name)
+        self.recompose(segment.x, segment.y, segment.width, segment.height)
+
+    def remove(self, name):
+        segment = self.elements.pop(name)
+        del self.z[name]
+        for band in self.band_range(segment.y, segment.height):
+            self.bands[band].discard(name)
+        self.recompose(segment.x, segment.y, segment.width, segment.height)
+        return segment
+
+    def update(self, name):
+        # The segment content changed in place
+        segment = self.elements[name]
+        self.recompose(segment.x, segment.y, segment.width, segment.height)
+
+    def query(self, x0, y0, x1, y1):
+        found = {}
+        for band in self.band_range(y0, y1 - y0):
+            for name in self.bands[band]:
+                segment = self.elements[name]
+                if (
+                    segment.x < x1
+                    and segment.x + segment.width > x0
+                    and segment.y < y1
+                    and segment.y + segment.height > y0
+                ):
+                    found[name] = segment
+        return found
+
+    def recompose(self, x, y, width, height):
+        x0 = max(x, 0)
+        y0 = max(y, 0)
+        x1 = min(x + width, self.target.width)
+        y1 = min(y + height, self.target.height)
+        if x1 <= x0 or y1 <= y0:
+            return
+
+        # Segments are blitted whole, grow the zone until it holds every
+        # segment overlapping it so upper layers are always redrawn on top
+        while True:
+            found = self.query(x0, y0, x1, y1)
+            nx0, ny0, nx1, ny1 = x0, y0, x1, y1
+            for segment in found.values():
+                nx0 = min(nx0, max(segment.x, 0))
+                ny0 = min(ny0, max(segment.y, 0))
+                nx1 = max(nx1, min(segment.x + segment.width, self.target.width))
+                ny1 = max(ny1, min(segment.y + segment.height, self.target.height))
+            if (nx0, ny0, nx1, ny1) == (x0, y0, x1, y1):
+                break
+            x0, y0, x1, y1 = nx0, ny0, nx1, ny1
+
+        names = list(found)
+        names.sort(key=lambda name: self.z[name])
+        target = self.target.framebuf
+        target.fill_rect(x0, y0, x1 - x0, y1 - y0, 0)
+        for name in names:
+            segment = found[name]
+            target.blit(segment.framebuf, segment.x, segment.y)
+        self.target.mark_dirty(x0, y0, x1 - x0, y1 - y0)
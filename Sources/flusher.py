@@ -0,0 +1,57 @@
+# Libs
+import uasyncio as asyncio
+
+
+class Flusher:
+    # Owns the display bus from a uasyncio task. Dirty windows are copied into
+    # a back buffer and pushed one page at a time, yielding between pages so
+    # rendering and network I/O keep running during a flush.
+    def __init__(self, oled, poll_ms=10):
+        self.oled = oled
+        self.poll_ms = poll_ms
+        self.back = bytearray(oled.width * oled.pages)
+        self.back_view = memoryview(self.back)
+        self.dirty_start = bytearray(oled.pages)
+        self.dirty_end = bytearray(oled.pages)
+        self.pending = False
+        self.flushing = False
+        # Statistics
+        self.frames = 0
+        self.coalesced = 0
+
+    def request(self):
+        # Frames asked for while one is pending collapse into the newest one
+        if self.pending:
+            self.coalesced += 1
+        self.pending = True
+
+    def snapshot(self):
+        oled = self.oled
+        for page in range(oled.pages):
+            x0 = oled.dirty_start[page]
+            x1 = oled.dirty_end[page]
+            self.dirty_start[page] = x0
+            self.dirty_end[page] = x1
+            if x0 <= x1:
+                start = page * oled.width
+                self.back_view[start + x0 : start + x1 + 1] = oled.frame_view[
+                    start + x0 : start + x1 + 1
+                ]
+        oled.clear_dirty()
+
+    async def run(self):
+        while True:
+            if not self.pending:
+                await asyncio.sleep_ms(self.poll_ms)
+                continue
+            self.pending = False
+            self.flushing = True
+            self.snapshot()
+            for page in range(self.oled.pages):
+                x0 = self.dirty_start[page]
+                x1 = self.dirty_end[page]
+                if x0 <= x1:
+                    self.oled.write_window(page, x0, x1, self.back_view)
+                    await asyncio.sleep_ms(0)
+            self.flushing = False
+            self.frames += 1
@@ -0,0 +1,94 @@
+# Libs
+import framebuf
+import ustruct
+
+# Packed font layout, little endian
+# header: magic b"AF", version, height, first char code, glyph count, 2 unused
+# index: per glyph, data offset (u16) from the start of the font, width, unused
+#        a width of 0 marks a code the font does not draw
+# data: per glyph, MONO_HMSB rows of (width + 7) // 8 bytes
+FONT_MAGIC = b"AF"
+FONT_VERSION = 1
+HEADER_SIZE = 8
+ENTRY_SIZE = 4
+
+
+class Font:
+    # Variable width bitmap font read glyph by glyph from a packed font file
+    # (or bytes kept in flash), with a small LRU cache of decoded glyphs
+    def __init__(self, source, cache_size=12, spacing=1):
+        if isinstance(source, str):
+            self.file = open(source, "rb")
+            self.data = None
+        else:
+            self.file = None
+            self.data = memoryview(source)
+        self.cache_size = cache_size
+        self.spacing = spacing
+        # Most recently used glyph codes at the end
+        self.cache = {}
+        self.lru = []
+        self.entry = bytearray(ENTRY_SIZE)
+
+        header = bytearray(HEADER_SIZE)
+        self.read(0, header)
+        if header[0:2] != FONT_MAGIC or header[2] != FONT_VERSION:
+            raise ValueError("Unsupported font " + str(source))
+        self.height = header[3]
+        self.first = header[4]
+        self.count = header[5]
+
+    def read(self, offset, buf):
+        if self.file is None:
+            buf[:] = self.data[offset : offset + len(buf)]
+        else:
+            self.file.seek(offset)
+            self.file.readinto(buf)
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+    def glyph(self, char):
+        # (width, framebuf) of a char, None when the font does not have it
+        code = ord(char)
+        if code in self.cache:
+            self.lru.remove(code)
+            self.lru.append(code)
+            return self.cache[code]
+        if not self.first <= code < self.first + self.count:
+            return None
+
+        self.read(HEADER_SIZE + (code - self.first) * ENTRY_SIZE, self.entry)
+        offset, width = ustruct.unpack_from("<HB", self.entry)
+        if not width:
+            return None
+        buf = bytearray((width + 7) // 8 * self.height)
+        self.read(offset, buf)
+        glyph = (
+            width,
+            framebuf.FrameBuffer(buf, width, self.height, framebuf.MONO_HMSB),
+        )
+
+        if len(self.lru) >= self.cache_size:
+            del self.cache[self.lru.pop(0)]
+        self.cache[code] = glyph
+        self.lru.append(code)
+        return glyph
+
+    def text_width(self, string):
+        width = 0
+        for char in string:
+            glyph = self.glyph(char)
+            if glyph is not None:
+                width += glyph[0] + self.spacing
+        return max(width - self.spacing, 0)
+
+    def text(self, target, string, x=0, y=0):
+        for char in string:
+            glyph = self.glyph(char)
+            if glyph is not None:
+                target.blit(glyph[1], x, y)
+                x += glyph[0] + self.spacing
+        return x
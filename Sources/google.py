@@ -11,7 +11,7 @@ class Google(Screen_element):
         # https://developers.google.com/identity/protocols/OAuth2ForDevices
         # https://console.developers.google.com/apis/credentials?project=esp32-watch&authuser=1
         def __init__(self, ntw, sc):
-            Screen_element.__init__(self, ntw, sc, 5)
+            Screen_element.__init__(self, ntw, sc, 5, const.GOOGLE_TIMEOUTS)
             self.ntw = ntw
             self.client_id = const.GOOGLE_CLIENT_ID
             self.client_secret = const.GOOGLE_CLIENT_SECRET
@@ -34,7 +34,7 @@ class Google(Screen_element):
         # Request device and user` codes
         def request_oauth_code(self, now):
             data = {"client_id": self.client_id, "scope": self.scope}
-            response = self.ntw.request("POST", const.GOOGLE_OAUTH_CODE_URL, data)
+            response = yield ("POST", const.GOOGLE_OAUTH_CODE_URL, data)
             if response is None:
                 print("Google oauth request ko")
             elif "error_code" in response or "error" in response:
@@ -62,24 +62,19 @@ class Google(Screen_element):
                     self.expires_at,
                     self.max_time_check,
                 )
-                self.sc.set_memory(
-                    name="google_text",
-                    elem_type="str",
-                    content=(0, 2, "Go to google.com"),
-                )
-                self.sc.set_memory(
-                    name="google_url", elem_type="str", content=(0, 3, verification_url)
-                )
-                self.sc.set_memory(
-                    name="google_code", elem_type="str", content=(0, 4, user_code)
-                )
+                with self.sc.frame():
+                    self.sc.set_widget("google_text", "Go to google.com")
+                    self.sc.set_widget("google_url", verification_url)
+                    self.sc.set_widget("google_code", user_code)
                 self.displayed = ["google_text", "google_url", "google_code"]
                 return False
 
         # Check user authorization
         def request_oauth_authorization(self, now):
-            response = self.ntw.request(
-                "POST", const.GOOGLE_OAUTH_TOKEN_URL, self.authorization_data
+            response = yield (
+                "POST",
+                const.GOOGLE_OAUTH_TOKEN_URL,
+                self.authorization_data,
             )
             if response is None:
                 print("Google oauth request ko")
@@ -90,8 +85,9 @@ class Google(Screen_element):
                 self.refresh_token = response["refresh_token"]
                 self.token_type = response["token_type"]
                 self.expires_at = now + response["expires_in"]
-                for elem in self.displayed:
-                    self.sc.set_memory(name=elem, delete=True)
+                with self.sc.frame():
+                    for elem in self.displayed:
+                        self.sc.clear_widget(elem)
                 print("Google oauth authorized")
                 print(
                     self.access_token,
@@ -115,7 +111,7 @@ class Google(Screen_element):
                 "client_secret": self.client_secret,
                 "grant_type": "refresh_token",
             }
-            response = self.ntw.request("POST", const.GOOGLE_OAUTH_TOKEN_URL, data)
+            response = yield ("POST", const.GOOGLE_OAUTH_TOKEN_URL, data)
             if response is None:
                 print("Google oauth request ko")
             elif "error_code" in response or "error" in response:
@@ -137,13 +133,13 @@ class Google(Screen_element):
             if self.refresh_token is None:
                 if time_before_expired > 0:
                     print("Requesting auth")
-                    return self.request_oauth_authorization(now)
+                    return (yield from self.request_oauth_authorization(now))
                 else:  # elif self.device_code is None:
                     print("Requesting code")
-                    return self.request_oauth_code(now)
+                    return (yield from self.request_oauth_code(now))
             elif time_before_expired - 60 <= 0:
                 print("Requesting refresh")
-                return self.request_oauth_refresh(now)
+                return (yield from self.request_oauth_refresh(now))
             elif self.access_token is not None:
                 return True
             print("Error")
@@ -166,11 +162,11 @@ class Google(Screen_element):
                 "Authorization": "Bearer " + access_token,
                 "Content-Type": "application/json; charset=UTF-8",
             }
-            response = self.ntw.request(
+            response = yield (
                 "POST",
                 self.file_url + "?uploadType=resumable",
-                data=data,
-                headers=headers,
+                data,
+                headers,
             )
             if "alternateLink" in response:
                 print("Success creating file")
@@ -181,51 +177,56 @@ class Google(Screen_element):
 
         def check_file(self, access_token):
             headers = {"Authorization": "Bearer " + access_token}
-            response = self.ntw.request(
-                "GET", self.file_url + "?maxResults=1", headers=headers
+            # A file list always has a kind, the first item id only when not empty
+            fields = {"kind": ("kind",), "id": ("items", 0, "id")}
+            response = yield (
+                "GET",
+                self.file_url + "?maxResults=1",
+                None,
+                headers,
+                fields,
             )
-            if "items" in response:
-                if len(response["items"]) == 0:
-                    self.create_file(access_token)
+            if response is not None and "kind" in response:
+                if "id" not in response:
+                    yield from self.create_file(access_token)
                 else:
                     print("No need to create drive file")
-                    self.file_id = response["items"][0]["id"]
+                    self.file_id = response["id"]
             else:
                 self.file_id = None
 
         def get_file(self, access_token):
             headers = {"Authorization": "Bearer " + access_token}
-            return self.ntw.request(
-                "GET",
-                self.file_url + "/" + self.file_id + "?alt=media",
-                headers=headers,
+            return (
+                yield (
+                    "GET",
+                    self.file_url + "/" + self.file_id + "?alt=media",
+                    None,
+                    headers,
+                )
             )
 
     def __init__(self, ntw, sc, max_time_check):
-        Screen_element.__init__(self, ntw, sc, max_time_check)
+        Screen_element.__init__(self, ntw, sc, max_time_check, const.GOOGLE_TIMEOUTS)
         self.oauth = self.Oauth(ntw, sc)
         self.drive = self.Drive(ntw)
         self.messages = None
-        self.accu = 0
+        # Number of email_<n> widgets in the layout
+        self.mail_lines = 4
 
-    def get(self):
-        if self.oauth.check_connected(utime.time()):
+    def fetch(self):
+        if (yield from self.oauth.check_connected(utime.time())):
             if self.drive.file_id is None:
-                self.drive.check_file(self.oauth.access_token)
+                yield from self.drive.check_file(self.oauth.access_token)
             else:
                 print("Drive ready", self.drive.file_id)
-                self.messages = self.drive.get_file(self.oauth.access_token)
+                self.messages = yield from self.drive.get_file(self.oauth.access_token)
                 if self.messages is not None:
-                    for pos in range(len(self.messages)):
-                        print(self.messages[pos])
-                        self.sc.set_memory(
-                            name="email_" + str(pos),
-                            elem_type="str",
-                            content=(
-                                0,
-                                2 + pos,
-                                str(self.accu) + self.messages[pos][2],
-                            ),
-                            delete=True,
-                        )
-                self.accu += 1
+                    with self.sc.frame():
+                        for pos in range(self.mail_lines):
+                            name = "email_" + str(pos)
+                            if pos < len(self.messages):
+                                print(self.messages[pos])
+                                self.sc.set_widget(name, self.messages[pos][2])
+                            else:
+                                self.sc.clear_widget(name)
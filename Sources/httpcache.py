@@ -0,0 +1,86 @@
+# Libs
+import ujson
+
+
+class HttpCache:
+    # Keeps the results of GET requests with their validators (ETag,
+    # Last-Modified) under a byte budget, least recently used out first.
+    # Revalidating an entry costs a header exchange, a 304 answer reuses the
+    # stored result instead of downloading the body again.
+    def __init__(self, budget=4096):
+        self.budget = budget
+        self.size = 0
+        # key -> (etag, last modified, serialized result)
+        self.entries = {}
+        # Most recently used keys at the end
+        self.lru = []
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def key(self, url, headers, fields):
+        # Same URL with another account or other fields is another entry
+        key = url + "|" + headers.get("Authorization", "")
+        if fields is not None:
+            key += "|" + str(fields)
+        return key
+
+    def conditional(self, key, headers):
+        # Request headers with the validators of the cached entry, if any
+        entry = self.entries.get(key)
+        if entry is None:
+            return headers
+        headers = dict(headers)
+        if entry[0] is not None:
+            headers["If-None-Match"] = entry[0]
+        if entry[1] is not None:
+            headers["If-Modified-Since"] = entry[1]
+        return headers
+
+    def hit(self, key):
+        # Cached result of key, once the server answered 304
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        self.hits += 1
+        self.lru.remove(key)
+        self.lru.append(key)
+        return ujson.loads(entry[2])
+
+    def store(self, key, status, headers, result):
+        self.misses += 1
+        etag = None
+        last_modified = None
+        for name in headers:
+            lower = name.lower()
+            if lower == "etag":
+                etag = headers[name]
+            elif lower == "last-modified":
+                last_modified = headers[name]
+        self.drop(key)
+        if status != 200 or result is None or (etag is None and last_modified is None):
+            return
+        data = ujson.dumps(result)
+        if len(data) > self.budget:
+            return
+        while self.size + len(data) > self.budget:
+            self.drop(self.lru[0])
+            self.evictions += 1
+        self.entries[key] = (etag, last_modified, data)
+        self.lru.append(key)
+        self.size += len(data)
+
+    def drop(self, key):
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            self.lru.remove(key)
+            self.size -= len(entry[2])
+
+    def stats(self):
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "entries": len(self.entries),
+            "size": self.size,
+        }
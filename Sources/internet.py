@@ -1,10 +1,14 @@
 # Libs
 import network
-from urequests import request
+import uarequest
+import urequest
 import ujson
 import utime
 
 # Local libs
+from httpcache import HttpCache
+from jsonfields import JsonFields
+
 # import uasyncio as asyncio
 # from screen import Screen_element
 import consts as const
@@ -22,32 +26,159 @@ class Network:
         self.ssid = None
         self.pswd = None
         # self.connected = False
+        # Keep alive connections, saves the TCP and TLS handshakes between polls
+        self.pool = urequest.ConnectionPool(
+            const.NTW_POOL_MAX_PER_HOST,
+            const.NTW_POOL_MAX_IDLE,
+            const.NTW_POOL_IDLE_TIMEOUT,
+        )
+        # Same for request_async, its connections are uasyncio streams
+        self.async_pool = uarequest.ConnectionPool(
+            const.NTW_POOL_MAX_PER_HOST,
+            const.NTW_POOL_MAX_IDLE,
+            const.NTW_POOL_IDLE_TIMEOUT,
+        )
+        # Resolved hosts, polling the same APIs does not need a lookup each time
+        self.dns = urequest.DnsCache(const.NTW_DNS_TTL, const.NTW_DNS_NEGATIVE_TTL)
+        # Field parser of the blocking requests, async ones make their own
+        self.json_fields = JsonFields()
+        # Revalidated GET results, unchanged content is not downloaded again
+        self.cache = HttpCache(const.NTW_CACHE_BUDGET)
+        # Hosts whose gzip bodies did not inflate in the window
+        self.no_gzip = []
+        # Requests stopped by their deadline, by limit
+        self.timeouts = {"connect": 0, "read": 0, "total": 0}
 
-    def request(self, request_type, url, data=None, headers={}):
+    def request(
+        self, request_type, url, data=None, headers={}, fields=None, timeouts=None
+    ):
+        # fields {name: path} streams only those values out of the body
+        # timeouts (connect, read, total) in seconds bound the whole request
         if self.wlan.isconnected():
             json = None
+            key = None
             if data is not None:
                 data = ujson.dumps(data)
+            if request_type == "GET":
+                key = self.cache.key(url, headers, fields)
+                headers = self.cache.conditional(key, headers)
             try:
-                response = request(request_type, url, data=data, headers=headers)
+                response = urequest.request(
+                    request_type,
+                    url,
+                    data=data,
+                    headers=headers,
+                    pool=self.pool,
+                    dns=self.dns,
+                    gzip_window=self.gzip_window(url),
+                    deadline=self.deadline(timeouts),
+                )
             except Exception as e:
-                print(e)
+                self.failed(e)
                 response = None
             if response is not None:
+                if key is not None and response.status_code == 304:
+                    response.close()
+                    return self.cache.hit(key)
                 try:
-                    json = response.json()
+                    if fields is None:
+                        json = response.json()
+                    else:
+                        json = self.json_fields.extract(response, fields)
+                except urequest.RequestTimeout as e:
+                    self.failed(e)
+                    json = None
                 except:
                     print("error in json")
+                    self.inflate_failed(response, url)
                     json = None
+                if key is not None:
+                    self.cache.store(key, response.status_code, response.headers, json)
                 response.close()
                 return json
         print("request error")
         return None
 
+    async def request_async(
+        self, request_type, url, data=None, headers={}, fields=None, timeouts=None
+    ):
+        # Same as request, other uasyncio tasks run while waiting on the network
+        if self.wlan.isconnected():
+            json = None
+            key = None
+            if data is not None:
+                data = ujson.dumps(data)
+            if request_type == "GET":
+                key = self.cache.key(url, headers, fields)
+                headers = self.cache.conditional(key, headers)
+            try:
+                response = await uarequest.request(
+                    request_type,
+                    url,
+                    data=data,
+                    headers=headers,
+                    pool=self.async_pool,
+                    dns=self.dns,
+                    gzip_window=self.gzip_window(url),
+                    deadline=self.deadline(timeouts),
+                )
+            except Exception as e:
+                self.failed(e)
+                response = None
+            if response is not None:
+                if key is not None and response.status_code == 304:
+                    await response.close()
+                    return self.cache.hit(key)
+                try:
+                    if fields is None:
+                        json = ujson.loads(await response.read())
+                    else:
+                        # The parser keeps its state across the awaits, so
+                        # concurrent requests each need their own
+                        json = await JsonFields().extract_async(response, fields)
+                except urequest.RequestTimeout as e:
+                    self.failed(e)
+                    json = None
+                except:
+                    print("error in json")
+                    self.inflate_failed(response, url)
+                    json = None
+                if key is not None:
+                    self.cache.store(key, response.status_code, response.headers, json)
+                await response.close()
+                return json
+        print("request error")
+        return None
+
+    def gzip_window(self, url):
+        if urequest.split_url(url)[1] in self.no_gzip:
+            return 0
+        return const.NTW_GZIP_WINDOW
+
+    def inflate_failed(self, response, url):
+        # Most likely a body referring further back than the window
+        host = urequest.split_url(url)[1]
+        if response.gzip and host not in self.no_gzip:
+            print("gzip body too large for the window, no gzip for", host)
+            self.no_gzip.append(host)
+
+    def deadline(self, timeouts):
+        if timeouts is None:
+            return None
+        return urequest.Deadline(timeouts[0], timeouts[1], timeouts[2])
+
+    def failed(self, e):
+        if isinstance(e, urequest.RequestTimeout):
+            self.timeouts[e.args[0]] += 1
+            print("request timeout", e.args[0], self.timeouts)
+        else:
+            print(e)
+
+    def connected(self):
+        return self.wlan.isconnected()
+
     def connect(self):
-        self.sc.set_memory(
-            name="connection_status", elem_type="pixel", content=(0, 0, "cross")
-        )
+        self.sc.set_widget("connection_status", "cross")
         print("connecting to:", self.ssid, " with password ", self.pswd)
         self.wlan.connect(self.ssid, self.pswd)
 
@@ -81,6 +212,8 @@ class Network:
             # If not connected try connecting
             if not self.wlan.isconnected() and not self.trying_to_connect:
                 print("connecting")
+                self.pool.close()
+                self.async_pool.close()
                 if self.get_best_wifi() is not None:
                     self.connect()
                     self.trying_to_connect = True
@@ -89,9 +222,7 @@ class Network:
             if self.wlan.isconnected():
                 self.ip = self.wlan.ifconfig()
                 print("network config:", self.ip)
-                self.sc.set_memory(
-                    name="connection_status", elem_type="pixel", content=(0, 0, "check")
-                )
+                self.sc.set_widget("connection_status", "check")
                 self.trying_to_connect = False
 
         return self.wlan.isconnected()
@@ -0,0 +1,257 @@
+# Streaming JSON field extractor
+
+# Libs
+import ujson
+
+QUOTE = const(0x22)
+COMMA = const(0x2C)
+COLON = const(0x3A)
+LBRACKET = const(0x5B)
+BACKSLASH = const(0x5C)
+RBRACKET = const(0x5D)
+LBRACE = const(0x7B)
+RBRACE = const(0x7D)
+WHITESPACE = b" \t\r\n"
+
+# Where the current value sits compared to the requested paths
+SKIP = const(0)
+DESCEND = const(1)
+CAPTURE = const(2)
+
+# Parser states, between two bytes of the body
+VALUE = const(0)  # Before a value
+KEY = const(1)  # Before an object key or the end of the object
+NAME = const(2)  # In an object key
+COLON_NEXT = const(3)  # After an object key
+AFTER = const(4)  # After a value, before a comma or the end of its container
+SPAN = const(5)  # In a value skipped or captured whole
+END = const(6)  # After the top level value
+
+
+class JsonFields:
+    # Pulls a few values out of a JSON body without building the document.
+    # Fields map a name to a path of object keys and array indexes, e.g.
+    # {"temp": ("main", "temp"), "id": ("weather", 0, "id")}.
+    # The body is fed piece by piece, from readinto() with extract() or from
+    # an awaited readinto() with extract_async().
+    # Everything off those paths is skipped byte by byte, so the heap only
+    # holds the read buffer, the keys on the way and the captured values.
+    def __init__(self, buf_size=64):
+        self.buf = bytearray(buf_size)
+        self.fields = None
+        self.result = None
+        self.pending = 0
+        self.state = VALUE
+        self.path = []
+        # Containers walked into, True for objects
+        self.objects = []
+        # Bytes of the current key or captured value
+        self.out = None
+        # Value skipped or captured whole: bracket depth, string and escape
+        # state, and whether it is kept
+        self.depth = 0
+        self.in_string = False
+        self.escape = False
+        self.capture = False
+
+    def extract(self, stream, fields):
+        # {name: value} for the fields found, missing ones are left out
+        self.start(fields)
+        mv = memoryview(self.buf)
+        while True:
+            n = stream.readinto(self.buf)
+            if not n:
+                break
+            if self.feed(mv[:n]):
+                # Read the rest so a keep alive connection can be reused
+                while stream.readinto(self.buf):
+                    pass
+                break
+        return self.finish()
+
+    async def extract_async(self, stream, fields):
+        # Same as extract from an awaited readinto()
+        self.start(fields)
+        mv = memoryview(self.buf)
+        while True:
+            n = await stream.readinto(self.buf)
+            if not n:
+                break
+            if self.feed(mv[:n]):
+                while await stream.readinto(self.buf):
+                    pass
+                break
+        return self.finish()
+
+    def start(self, fields):
+        self.fields = fields
+        self.result = {}
+        self.pending = len(fields)
+        self.state = VALUE
+        self.path = []
+        self.objects = []
+        self.out = None
+
+    def feed(self, data):
+        # Parses the next piece of the body, True once every field is found
+        i = 0
+        n = len(data)
+        while i < n and self.pending:
+            c = data[i]
+            state = self.state
+            if state == SPAN:
+                if not self.span(c):
+                    # c ended a number or literal, it belongs to the container
+                    continue
+            elif state == NAME:
+                self.name(c)
+            elif c in WHITESPACE or state == END:
+                pass
+            elif state == VALUE:
+                self.value(c)
+            elif state == AFTER:
+                self.after(c)
+            elif state == KEY:
+                if c == QUOTE:
+                    self.out = bytearray()
+                    self.escape = False
+                    self.state = NAME
+                elif c == RBRACE:
+                    self.close()
+                else:
+                    self.unexpected(c)
+            elif c == COLON:
+                self.state = VALUE
+            else:
+                self.unexpected(c)
+            i += 1
+        return not self.pending
+
+    def finish(self):
+        # {name: value} for the fields found, missing ones are left out
+        if self.pending:
+            if self.state == SPAN and not self.objects and not self.depth:
+                # A top level number or literal ends with the body
+                if self.in_string:
+                    raise ValueError("Unterminated JSON string")
+                self.end_span()
+            elif self.state != END and (self.state != VALUE or self.objects):
+                raise ValueError("Unexpected end of JSON")
+        result = self.result
+        self.result = None
+        self.out = None
+        return result
+
+    def unexpected(self, c):
+        raise ValueError("Unexpected JSON byte " + str(c))
+
+    def on_path(self, path, exact):
+        depth = len(self.path)
+        if len(path) < depth or (exact and len(path) != depth):
+            return False
+        for i in range(depth):
+            if path[i] != self.path[i]:
+                return False
+        return True
+
+    def match(self):
+        state = SKIP
+        for name in self.fields:
+            if name not in self.result and self.on_path(self.fields[name], False):
+                if len(self.fields[name]) == len(self.path):
+                    return CAPTURE
+                state = DESCEND
+        return state
+
+    def value(self, c):
+        if c == RBRACKET and self.objects and not self.objects[-1]:
+            # Empty array
+            self.close()
+            return
+        state = self.match()
+        if state == DESCEND and c == LBRACE:
+            self.objects.append(True)
+            self.path.append(None)
+            self.state = KEY
+        elif state == DESCEND and c == LBRACKET:
+            self.objects.append(False)
+            self.path.append(0)
+        else:
+            self.capture = state == CAPTURE
+            if self.capture:
+                self.out = bytearray()
+                self.out.append(c)
+            self.depth = 1 if c == LBRACE or c == LBRACKET else 0
+            self.in_string = c == QUOTE
+            self.escape = False
+            self.state = SPAN
+
+    def span(self, c):
+        # False when c ends a number or literal and is not part of it
+        ended = False
+        if self.in_string:
+            if self.escape:
+                self.escape = False
+            elif c == BACKSLASH:
+                self.escape = True
+            elif c == QUOTE:
+                self.in_string = False
+                ended = not self.depth
+        elif self.depth:
+            if c == QUOTE:
+                self.in_string = True
+            elif c == LBRACE or c == LBRACKET:
+                self.depth += 1
+            elif c == RBRACE or c == RBRACKET:
+                self.depth -= 1
+                ended = not self.depth
+        elif c in WHITESPACE or c == COMMA or c == RBRACE or c == RBRACKET:
+            self.end_span()
+            return False
+        if self.capture:
+            self.out.append(c)
+        if ended:
+            self.end_span()
+        return True
+
+    def end_span(self):
+        if self.capture:
+            value = ujson.loads(bytes(self.out))
+            self.out = None
+            for name in self.fields:
+                if name not in self.result and self.on_path(self.fields[name], True):
+                    self.result[name] = value
+                    self.pending -= 1
+        self.state = AFTER if self.objects else END
+
+    def name(self, c):
+        if self.escape:
+            self.escape = False
+        elif c == BACKSLASH:
+            self.escape = True
+        elif c == QUOTE:
+            if BACKSLASH in self.out:
+                self.path[-1] = ujson.loads(b'"' + self.out + b'"')
+            else:
+                self.path[-1] = str(self.out, "utf-8")
+            self.out = None
+            self.state = COLON_NEXT
+            return
+        self.out.append(c)
+
+    def after(self, c):
+        if c == COMMA:
+            if self.objects[-1]:
+                self.state = KEY
+            else:
+                self.path[-1] += 1
+                self.state = VALUE
+        elif c == (RBRACE if self.objects[-1] else RBRACKET):
+            self.close()
+        else:
+            self.unexpected(c)
+
+    def close(self):
+        self.objects.pop()
+        self.path.pop()
+        self.state = AFTER if self.objects else END
@@ -0,0 +1,107 @@
+# Local libs
+from ssd1306 import Segment
+from compositor import LAYER_BACKGROUND
+from compositor import LAYER_CONTENT
+from compositor import LAYER_MODAL
+
+# Pages, the first one is shown at boot
+PAGES = ("home", "weather", "mail", "diagnostics")
+ALL_PAGES = "*"
+
+# Widgets, name -> (page, elem_type, unit, x, y, width, height, layer, option)
+# page is a name from PAGES or ALL_PAGES. unit "cell" counts text columns and
+# rows, "px" counts pixels. option is the font of "text" widgets and the pixels
+# per second of "marquee" widgets.
+WIDGETS = {
+    # Frame
+    "line_top": ("*", "rect", "px", 0, 9, 128, 2, LAYER_BACKGROUND, None),
+    "line_bottom": ("*", "rect", "px", 0, 53, 128, 2, LAYER_BACKGROUND, None),
+    # Header
+    "connection_status": ("*", "pixel", "cell", 0, 0, 1, 1, LAYER_CONTENT, None),
+    "date": ("*", "str", "cell", 1, 0, 7, 1, LAYER_CONTENT, None),
+    # Home
+    "scroll_text": ("home", "marquee", "cell", 0, 2, 16, 1, LAYER_CONTENT, None),
+    "time": ("home", "text", "cell", 3, 4, 10, 2, LAYER_CONTENT, "clock"),
+    "google_text": ("home", "str", "cell", 0, 2, 16, 1, LAYER_MODAL, None),
+    "google_url": ("home", "str", "cell", 0, 3, 16, 1, LAYER_MODAL, None),
+    "google_code": ("home", "str", "cell", 0, 4, 16, 1, LAYER_MODAL, None),
+    "weather_art": ("home", "pixel", "cell", 0, 7, 1, 1, LAYER_CONTENT, None),
+    "weather_temp": ("home", "str", "cell", 1, 7, 3, 1, LAYER_CONTENT, None),
+    "weather_temp_type": ("home", "pixel", "cell", 4, 7, 1, 1, LAYER_CONTENT, None),
+    "weather_humidity": ("home", "str", "cell", 5, 7, 4, 1, LAYER_CONTENT, None),
+    # Weather detail
+    "forecast": ("weather", "marquee", "cell", 0, 2, 16, 1, LAYER_CONTENT, None),
+    "forecast_art": ("weather", "pixel", "cell", 0, 4, 1, 1, LAYER_CONTENT, None),
+    "forecast_temp": ("weather", "text", "cell", 2, 3, 4, 2, LAYER_CONTENT, "clock"),
+    "forecast_type": ("weather", "pixel", "cell", 6, 3, 1, 1, LAYER_CONTENT, None),
+    "pressure": ("weather", "str", "cell", 8, 3, 8, 1, LAYER_CONTENT, None),
+    "humidity": ("weather", "str", "cell", 8, 4, 8, 1, LAYER_CONTENT, None),
+    # Mail
+    "email_0": ("mail", "marquee", "cell", 0, 2, 16, 1, LAYER_CONTENT, None),
+    "email_1": ("mail", "marquee", "cell", 0, 3, 16, 1, LAYER_CONTENT, None),
+    "email_2": ("mail", "marquee", "cell", 0, 4, 16, 1, LAYER_CONTENT, None),
+    "email_3": ("mail", "marquee", "cell", 0, 5, 16, 1, LAYER_CONTENT, None),
+    # Diagnostics
+    "diag_ip": ("diagnostics", "str", "cell", 0, 2, 16, 1, LAYER_CONTENT, None),
+    "diag_mem": ("diagnostics", "str", "cell", 0, 3, 16, 1, LAYER_CONTENT, None),
+    "diag_pool": ("diagnostics", "str", "cell", 0, 4, 16, 1, LAYER_CONTENT, None),
+    "diag_flush": ("diagnostics", "str", "cell", 0, 5, 16, 1, LAYER_CONTENT, None),
+}
+
+
+class Widget:
+    def __init__(self, name, page, elem_type, x, y, width, height, layer, option):
+        self.name = name
+        self.page = page
+        self.elem_type = elem_type
+        self.x = x
+        self.y = y
+        self.width = width
+        self.height = height
+        self.layer = layer
+        self.option = option
+        # Preallocated once, every redraw reuses it
+        self.segment = Segment(x, y, width, height)
+
+    def overlaps(self, other):
+        if self.page != other.page and ALL_PAGES not in (self.page, other.page):
+            return False
+        return (
+            self.x < other.x + other.width
+            and other.x < self.x + self.width
+            and self.y < other.y + other.height
+            and other.y < self.y + self.height
+        )
+
+
+class Layout:
+    # Resolves the widget declarations into integer pixel geometry once and
+    # refuses layouts where two widgets of the same page and layer overlap
+    def __init__(self, widgets, screen_width, screen_height, cell_width, cell_height):
+        self.widgets = {}
+        for name in widgets:
+            page, elem_type, unit, x, y, width, height, layer, option = widgets[name]
+            if unit == "cell":
+                x *= cell_width
+                y *= cell_height
+                width *= cell_width
+                height *= cell_height
+            if x < 0 or y < 0 or x + width > screen_width or y + height > screen_height:
+                raise ValueError("Widget " + name + " is out of the screen")
+            if page != ALL_PAGES and page not in PAGES:
+                raise ValueError("Widget " + name + " is on an unknown page")
+            self.widgets[name] = Widget(
+                name, page, elem_type, x, y, width, height, layer, option
+            )
+        self.check_overlaps()
+
+    def check_overlaps(self):
+        names = list(self.widgets)
+        for pos in range(len(names)):
+            widget = self.widgets[names[pos]]
+            for other_name in names[pos + 1 :]:
+                other = self.widgets[other_name]
+                if widget.layer == other.layer and widget.overlaps(other):
+                    raise ValueError(
+                        "Widgets " + widget.name + " and " + other.name + " overlap"
+                    )
@@ -0,0 +1,60 @@
+# Libs
+import utime
+
+# Strip widths are rounded to this many pixels so the strips of texts of
+# close lengths share one size class of the segment pool
+STRIP_STEP = const(32)
+
+
+class Marquee:
+    # Renders a string once into an off screen strip and scrolls a window
+    # over it at a fixed rate in pixels per second. The strip comes from the
+    # segment pool, release() gives it back.
+    def __init__(self, segment, string, speed, max_fps, pool, gap=32):
+        self.segment = segment
+        self.speed = speed
+        text_width = len(string) * 8
+        self.scrolling = text_width > segment.width
+        # One pixel per frame at most, a static marquee needs no frames
+        self.fps = min(speed, max_fps) if self.scrolling else 0
+
+        # Strip at least as wide as the window so two blits always cover it
+        if self.scrolling:
+            strip_width = max(text_width + gap, segment.width)
+        else:
+            strip_width = segment.width
+        self.strip_width = (strip_width + STRIP_STEP - 1) // STRIP_STEP * STRIP_STEP
+        self.pool = pool
+        self.strip_segment = pool.acquire(0, 0, self.strip_width, 8)
+        self.strip = self.strip_segment.framebuf
+        self.strip.text(string, 0, 0, 1)
+
+        self.start = utime.ticks_ms()
+        self.offset = -1
+        self.draw(0)
+
+    def draw(self, offset):
+        self.offset = offset
+        self.segment.framebuf.blit(self.strip, -offset, 0)
+        if offset:
+            self.segment.framebuf.blit(self.strip, self.strip_width - offset, 0)
+
+    def tick(self, now):
+        # Returns True when the window moved and has to be merged again
+        if not self.scrolling:
+            return False
+        elapsed = utime.ticks_diff(now, self.start)
+        offset = (elapsed * self.speed // 1000) % self.strip_width
+        if offset == self.offset:
+            return False
+        self.draw(offset)
+        return True
+
+    def restart(self, now):
+        self.start = now
+        self.draw(0)
+
+    def release(self):
+        self.pool.release(self.strip_segment)
+        self.strip_segment = None
+        self.strip = None
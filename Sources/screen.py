@@ -1,13 +1,55 @@
 # Libs
 import machine
+import uasyncio as asyncio
 import utime
 
 # Local libs
-from ssd1306 import Segment
+from ssd1306 import SegmentPool
+from ssd1306 import Sprite
 from ssd1306 import SSD1306_I2C
+from ssd1306 import SSD1306_SPI
+from marquee import Marquee
+from compositor import Compositor
+from flusher import Flusher
+from font import Font
+from layout import Layout
+from layout import ALL_PAGES
+from layout import PAGES
+from layout import WIDGETS
+import assets
 import consts as const
 
-# import uasyncio as asyncio
+
+class Frame:
+    # Context manager grouping several widget updates into one flush
+    def __init__(self, sc):
+        self.sc = sc
+
+    def __enter__(self):
+        self.sc.begin_frame()
+        return self.sc
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.sc.commit_frame()
+        return False
+
+
+class Screen_Page:
+    # Off screen page with its own buffer and compositor, updated in the
+    # background and shown by swapping its buffer into the display driver
+    def __init__(self, name, oled, buffers):
+        self.name = name
+        self.oled = oled
+        self.width = oled.width
+        self.height = oled.height
+        self.buffer, self.framebuf, self.frame_view = buffers
+        self.active = False
+        self.compositor = Compositor(self)
+
+    def mark_dirty(self, x, y, width, height):
+        # Hidden pages are drawn without touching the bus
+        if self.active:
+            self.oled.mark_dirty(x, y, width, height)
 
 
 class Screen_Handler:
@@ -18,265 +60,325 @@ class Screen_Handler:
         self.screen_spacing = 8
         self.screen_width = 128
         self.screen_height = 64
-        self.char_width = int(self.screen_width / self.screen_columns)
-        self.char_height = int(self.screen_height / self.screen_spacing) - 1
+        self.char_width = self.screen_width // self.screen_columns
+        self.row_height = self.screen_height // self.screen_spacing
+        self.char_height = self.row_height - 1
+
+        if const.SCREEN_BUS == "spi":
+            print("SPI setup")
+            pins = const.SCREEN_SPI_PINS
+            self.spi = machine.SPI(
+                const.SCREEN_SPI_ID,
+                baudrate=const.SCREEN_SPI_BAUDRATE,
+                sck=machine.Pin(pins["sck"]),
+                mosi=machine.Pin(pins["mosi"]),
+            )
 
-        print("I2C setup")
-        # For small board uncomment this
-        pin16 = machine.Pin(16, machine.Pin.OUT)
-        # set reset Pin hight
-        pin16.value(1)
-        machine.Pin(16, machine.Pin.OUT).value(1)
-        self.i2c = machine.I2C(scl=machine.Pin(15), sda=machine.Pin(4))
+            print("OLED setup")
+            self.oled = SSD1306_SPI(
+                self.screen_width,
+                self.screen_height,
+                self.spi,
+                dc=machine.Pin(pins["dc"]),
+                res=machine.Pin(pins["res"]),
+                cs=machine.Pin(pins["cs"]),
+                baudrate=const.SCREEN_SPI_BAUDRATE,
+            )
+        else:
+            print("I2C setup")
+            # For small board uncomment this
+            pin16 = machine.Pin(16, machine.Pin.OUT)
+            # set reset Pin hight
+            pin16.value(1)
+            machine.Pin(16, machine.Pin.OUT).value(1)
+            self.i2c = machine.I2C(scl=machine.Pin(15), sda=machine.Pin(4))
 
-        # self.i2c = machine.I2C(scl=machine.Pin(4), sda=machine.Pin(5))
+            # self.i2c = machine.I2C(scl=machine.Pin(4), sda=machine.Pin(5))
 
-        print("OLED setup")
-        self.oled = SSD1306_I2C(self.screen_width, self.screen_height, self.i2c)
+            print("OLED setup")
+            self.oled = SSD1306_I2C(self.screen_width, self.screen_height, self.i2c)
         self.oled.fill(0)
+
+        # Pages, the first one draws straight in the driver buffer
+        self.pages = {}
+        for name in PAGES:
+            if not self.pages:
+                buffers = (self.oled.buffer, self.oled.framebuf, self.oled.frame_view)
+            else:
+                buffers = self.oled.new_buffer()
+            self.pages[name] = Screen_Page(name, self.oled, buffers)
+        self.page = self.pages[PAGES[0]]
+        self.page.active = True
+
         self.memory_index = {}
+        # Pages each displayed element is on
+        self.element_pages = {}
+        # Value of the last draw of each widget
+        self.fingerprints = {}
+        # Scrolling text elements, advanced by animate()
+        self.marquees = {}
+        # Buffers of the marquee strips, reused from one text to the next
+        self.segments = SegmentPool()
+        # Deadline of the next animation frame in ticks_ms, None when idle
+        self.next_frame = None
 
-        # Array of functions for displayable elements
-        self.displayables = {
-            "str": self.display_str,
-            "pixel": self.display_pixel,
-            "line": self.display_line,
-            "rect": self.display_rect,
-        }
-
-        # Pixel arts
-        self.pixel_art = {
-            "up_arrow": [
-                "001100",
-                "011110",
-                "111111",
-                "001100",
-                "001100",
-                "001100",
-                "001100",
-            ],
-            "cross": [
-                "100001",
-                "110011",
-                "011110",
-                "001100",
-                "011110",
-                "110011",
-                "100001",
-            ],
-            "check": [
-                "000001",
-                "000001",
-                "000011",
-                "000010",
-                "110110",
-                "011100",
-                "001100",
-            ],
-            "thunder": [
-                "011110",
-                "111111",
-                "111111",
-                "011110",
-                "000100",
-                "001100",
-                "001000",
-            ],
-            "rain": [
-                "011110",
-                "111111",
-                "111111",
-                "011110",
-                "010010",
-                "001001",
-                "010010",
-            ],
-            "snow": [
-                "011110",
-                "111111",
-                "111111",
-                "011110",
-                "101010",
-                "010101",
-                "101010",
-            ],
-            "mist": [
-                "011110",
-                "111111",
-                "111111",
-                "011110",
-                "000111",
-                "111000",
-                "000111",
-            ],
-            "clear": [
-                "011110",
-                "111111",
-                "111111",
-                "111111",
-                "111111",
-                "011110",
-                "000000",
-            ],
-            "clouds": [
-                "001110",
-                "011111",
-                "011111",
-                "110001",
-                "100001",
-                "100001",
-                "011110",
-            ],
-            "celcius": [
-                "011000",
-                "100000",
-                "100000",
-                "011000",
-                "000000",
-                "000000",
-                "000000",
-            ],
-        }
-
-        # Top line
-        self.set_memory(
-            name="line_top",
-            elem_type="rect",
-            content=(0, self.height_to_pixel(2) - 7, self.screen_width, 2, True, 1),
-        )
+        # Frame transactions, flush only when the outermost one is committed
+        self.frame_depth = 0
+        self.frame_context = Frame(self)
+        # Asynchronous flush task, see start_flusher
+        self.flusher = None
 
-        # Bottom line
-        self.set_memory(
-            name="line_bottom",
-            elem_type="rect",
-            content=(0, self.height_to_pixel(6) + 5, self.screen_width, 2, True, 1),
+        # Packed fonts, opened on first use
+        self.fonts = {}
+
+        # Pixel arts from the compiled assets, unpacked on first use
+        self.pixel_art = {}
+
+        # Widget geometry, resolved and checked once
+        self.layout = Layout(
+            WIDGETS,
+            self.screen_width,
+            self.screen_height,
+            self.char_width,
+            self.row_height,
         )
 
-    def width_to_pixel(self, x):
-        return int(self.screen_width / self.screen_columns * x)
-
-    def height_to_pixel(self, y):
-        return int(self.screen_height / self.screen_spacing * y)
-
-    def pixel_to_width(self, x):
-        return int(x / (self.screen_width / self.screen_columns))
-
-    def pixel_to_height(self, y):
-        return int(y / (self.screen_height / self.screen_spacing))
-
-    # x, y, string
-    def display_str(self, elem):
-        x, y, string = elem
-        x1 = self.width_to_pixel(x)
-        y1 = self.height_to_pixel(y)
-        x2 = (len(string) + 1) * self.char_width
-        y2 = y1 + self.char_height
-
-        segment = Segment(x1, y1, x2 - x1, y2 - y1)
-        self.oled.text(segment, string)
-        return segment
-
-    # x, y, content_name
-    def display_pixel(self, elem):
-        x, y, content_name = elem
-        x1 = self.width_to_pixel(x)
-        y1 = self.height_to_pixel(y)
-        art = self.pixel_art[content_name]
-
-        y2 = 0
-        segment = Segment(x1, y1, len(art[0]), len(art))
-        for pixel_str in self.pixel_art[content_name]:
-            x2 = 0
-            for pixel in pixel_str:
-                if pixel == "1":
-                    self.oled.pixel(segment, x2, y2, 1)
-                x2 += 1
-            y2 += 1
-        return segment
-
-    # x1, y1, x2, y2
-    def display_line(self, elem):
-        x1, y1, x2, y2 = elem
-        segment = Segment(x1, y1, x2 - x1, y2 - y1)
-        self.oled.line(segment, x2, y2)
-        return segment
-
-    # x, y, width, height, fill, col
-    def display_rect(self, elem):
-        x, y, width, height, fill, col = elem
-        segment = Segment(x, y, width, height)
-        self.oled.rect(segment, width, height, fill, col)
-        return segment
-
-    def set_memory(
-        self, name, elem_type=None, content=None, scroll=False, delete=False
-    ):
-        # Reset zone and delete element if needed
-        if (delete or scroll) and name in self.memory_index:
-            self.oled.reset_zone(self.memory_index[name])
-            if delete or self.memory_index[name].needs_reset:
-                del self.memory_index[name]
-
-        # Create element if needed and display
-        if elem_type is not None and content is not None:
-            if name not in self.memory_index:
-                segment = self.displayables[elem_type](content)
+        self.widget_pages = {}
+        for name in self.layout.widgets:
+            page = self.layout.widgets[name].page
+            if page == ALL_PAGES:
+                self.widget_pages[name] = list(self.pages.values())
             else:
-                segment = self.memory_index[name]
-            self.oled.merge_framebuff(segment)
-            if scroll:
-                self.oled.scroll(segment)
-            self.memory_index[name] = segment
-
-        # def get_async(self):
-        #     while True:
-        #         # print("screen update")
-        #         # Set time
-        #         localtime = utime.localtime()
-        #         date = " " + "%02d" % localtime[2] + "/" + "%02d" % localtime[1]
-        #         time = (
-        #             "%02d" % localtime[3]
-        #             + ":"
-        #             + "%02d" % localtime[4]
-        #             + ":"
-        #             + "%02d" % localtime[5]
-        #         )
-        #         self.set_memory(
-        #             name="date",
-        #             elem_type="str",
-        #             content=(1, 0, time + " " + date),
-        #             update=True,
-        #             delete=True,
-        #         )
-        #         # self.oled.show()
-        #         utime.sleep(const.MAIN_CYCLE_TIME)
+                self.widget_pages[name] = [self.pages[page]]
+
+        with self.frame():
+            self.set_widget("line_top", 1)
+            self.set_widget("line_bottom", 1)
+
+    def begin_frame(self):
+        self.frame_depth += 1
+
+    def commit_frame(self):
+        self.frame_depth -= 1
+        if self.frame_depth <= 0:
+            self.frame_depth = 0
+            self.request_flush()
+
+    def frame(self):
+        return self.frame_context
+
+    def start_flusher(self, loop):
+        # From now on the uasyncio flush task owns the bus
+        self.flusher = Flusher(self.oled)
+        loop.create_task(self.flusher.run())
+
+    def request_flush(self):
+        # While something is animating, flushes wait for the next frame
+        # deadline so they go out with the animation at a steady pace
+        if not self.frame_rate():
+            self.flush()
+
+    def flush(self):
+        if not self.oled.is_dirty():
+            return
+        if self.flusher is not None:
+            self.flusher.request()
+        else:
+            self.oled.show()
+
+    def font(self, name):
+        # Font files are read from flash, the compiled ones are the fallback,
+        # also when the file is missing or cannot be opened
+        if name not in self.fonts:
+            font = None
+            if name in const.SCREEN_FONTS:
+                try:
+                    font = Font(const.SCREEN_FONTS[name])
+                except OSError as e:
+                    if name not in assets.FONTS:
+                        raise
+                    print("Font file of", name, "not opened:", e)
+            if font is None:
+                font = Font(assets.FONTS[name])
+            self.fonts[name] = font
+        return self.fonts[name]
+
+    def sprite(self, name):
+        if name not in self.pixel_art:
+            width, height, data = assets.SPRITES[name]
+            self.pixel_art[name] = Sprite(width, height, data)
+        return self.pixel_art[name]
+
+    def add(self, name, segment, layer, pages):
+        self.memory_index[name] = segment
+        self.element_pages[name] = pages
+        for page in pages:
+            page.compositor.add(name, segment, layer)
+
+    def refresh(self, name):
+        # The segment content changed in place
+        for page in self.element_pages[name]:
+            page.compositor.update(name)
+
+    def remove(self, name):
+        del self.memory_index[name]
+        for page in self.element_pages.pop(name):
+            page.compositor.remove(name)
+        del self.fingerprints[name]
+        self.drop_marquee(name)
+
+    def set_widget(self, name, value):
+        # Draw a value into a layout widget, reusing its segment
+        if self.fingerprints.get(name) == ("widget", value):
+            return
+        widget = self.layout.widgets[name]
+        segment = widget.segment
+        segment.reset(widget.x, widget.y)
+        self.drop_marquee(name)
+
+        if widget.elem_type == "str":
+            self.oled.text(segment, value)
+        elif widget.elem_type == "pixel":
+            self.oled.sprite(segment, self.sprite(value))
+        elif widget.elem_type == "text":
+            self.font(widget.option).text(segment.framebuf, value)
+        elif widget.elem_type == "rect":
+            self.oled.rect(segment, widget.width, widget.height, True, value)
+        elif widget.elem_type == "marquee":
+            self.marquees[name] = Marquee(
+                segment,
+                value,
+                widget.option or const.SCREEN_MARQUEE_SPEED,
+                const.SCREEN_MAX_FPS,
+                self.segments,
+            )
+
+        if name in self.memory_index:
+            self.refresh(name)
+        else:
+            self.add(name, segment, widget.layer, self.widget_pages[name])
+        self.fingerprints[name] = ("widget", value)
+
+        if not self.frame_depth:
+            self.request_flush()
+
+    def drop_marquee(self, name):
+        # The strip goes back to the pool for the next marquee
+        marquee = self.marquees.pop(name, None)
+        if marquee is not None:
+            marquee.release()
+
+    def clear_widget(self, name):
+        if name in self.memory_index:
+            self.remove(name)
+            if not self.frame_depth:
+                self.request_flush()
+
+    def show_page(self, name):
+        # Swap the pre-rendered page in, only the flush is left to do
+        if name == self.page.name:
+            return
+        self.page.active = False
+        self.page = self.pages[name]
+        self.page.active = True
+        self.oled.set_buffer(self.page.buffer, self.page.framebuf, self.page.frame_view)
+        self.next_frame = None
+        if not self.frame_depth:
+            self.flush()
+
+    def next_page(self):
+        pos = PAGES.index(self.page.name)
+        self.show_page(PAGES[(pos + 1) % len(PAGES)])
+
+    def restart_marquees(self):
+        # Scroll the shown marquees back to their beginning
+        now = utime.ticks_ms()
+        with self.frame():
+            for name in self.marquees:
+                if self.shown(name):
+                    self.marquees[name].restart(now)
+                    self.refresh(name)
+
+    def shown(self, name):
+        return self.page in self.element_pages[name]
+
+    def frame_rate(self):
+        # Highest rate asked by the shown animations, 0 when idle
+        fps = 0
+        for name in self.marquees:
+            if self.shown(name):
+                fps = max(fps, self.marquees[name].fps)
+        return fps
+
+    def time_to_next_frame(self):
+        # Milliseconds until the next frame deadline, None when idle
+        if self.next_frame is None:
+            return None
+        return max(utime.ticks_diff(self.next_frame, utime.ticks_ms()), 0)
+
+    def update(self):
+        # Render and flush animations on their frame deadlines, independently
+        # of how often the main loop runs
+        fps = self.frame_rate()
+        if not fps:
+            self.next_frame = None
+            return
+        now = utime.ticks_ms()
+        period = 1000 // fps
+        if self.next_frame is None or utime.ticks_diff(now, self.next_frame) > period:
+            # First frame or we fell behind, realign the deadlines on now
+            self.next_frame = now
+        elif utime.ticks_diff(self.next_frame, now) > 0:
+            return
+        self.animate(self.next_frame)
+        self.next_frame = utime.ticks_add(self.next_frame, period)
+
+    def animate(self, now):
+        # Move the shown marquee windows, only their pages get flushed
+        for name in self.marquees:
+            marquee = self.marquees[name]
+            if self.shown(name) and marquee.tick(now):
+                self.refresh(name)
+
+        if not self.frame_depth:
+            self.flush()
 
 
 class Screen_element:
-    def __init__(self, ntw, sc, max_time_check):
+    def __init__(self, ntw, sc, max_time_check, timeouts=None):
         self.ntw = ntw
         self.sc = sc
         self.next_time_check = 0
         self.time_diff = 0
         self.max_time_check = max_time_check
+        # (connect, read, total) seconds for each request of the element
+        self.timeouts = timeouts
+
+    def fetch(self):
+        # Generator doing the update: yields the arguments of each
+        # Network.request it needs, receives their result, and returns what
+        # get() returns. get() and get_async() drive the same generator.
+        return False
+        yield
 
-    # async def get_async(self):
-    #    while True:
-    #        if self.ntw.connected:
-    #            self.get()
-    #            wait_time = self.max_time_check
-    #        else:
-    #            wait_time = const.MAIN_CYCLE_TIME
-    #        await asyncio.sleep(wait_time)
-
-    # def get_async(self):
-    #     while True:
-    #         if self.ntw.connected:
-    #             self.get()
-    #             wait_time = self.max_time_check
-    #         else:
-    #             wait_time = const.MAIN_CYCLE_TIME
-    #         utime.sleep(wait_time)
+    def get(self):
+        steps = self.fetch()
+        try:
+            args = next(steps)
+            while True:
+                args = steps.send(self.ntw.request(*args, timeouts=self.timeouts))
+        except StopIteration as done:
+            return done.value
+
+    async def get_async(self):
+        steps = self.fetch()
+        try:
+            args = next(steps)
+            while True:
+                response = await self.ntw.request_async(*args, timeouts=self.timeouts)
+                args = steps.send(response)
+        except StopIteration as done:
+            return done.value
 
     def check(self, now):
         if self.next_time_check - now < 0:  # and self.ntw.connected:
@@ -284,3 +386,17 @@ class Screen_element:
                 self.next_time_check = utime.time() + self.max_time_check
             else:
                 self.next_time_check = utime.time() + const.MAIN_CYCLE_TIME * 10
+
+    async def check_async(self, now):
+        if self.next_time_check - now < 0:
+            if await self.get_async():
+                self.next_time_check = utime.time() + self.max_time_check
+            else:
+                self.next_time_check = utime.time() + const.MAIN_CYCLE_TIME * 10
+
+    async def run(self):
+        # uasyncio task, the element fetches while other tasks keep running
+        while True:
+            if self.ntw.connected():
+                await self.check_async(utime.time())
+            await asyncio.sleep(const.MAIN_CYCLE_TIME)
@@ -27,24 +27,82 @@ SET_CHARGE_PUMP = const(0x8D)
 
 class Segment:
     def __init__(self, x, y, width, height):
-        # crash without is it height if == 2
+        # MONO_HMSB packs 8 horizontal pixels per byte, the rows are kept
+        # exact so a segment never covers the rows of its neighbours
         width = int(ceil(width / 8.0)) * 8
-        height = int(ceil(height / 8.0)) * 8
 
         self.buffer = bytearray(height * width // 8)
         self.framebuf = framebuf.FrameBuffer1(
             memoryview(self.buffer), width, height, framebuf.MONO_HMSB
         )
-        self.framebuf.fill(0)
 
         self.width = width
         self.height = height
+        self.reset(x, y)
 
+    def reset(self, x, y):
+        self.framebuf.fill(0)
         self.x = x
         self.y = y
 
-        self.pixel_scrolled = 0
-        self.needs_reset = False
+
+class SegmentPool:
+    # Keeps released segments by size class so redraws reuse their buffers
+    # instead of allocating a new bytearray and FrameBuffer each time
+    def __init__(self, max_free=4):
+        self.max_free = max_free
+        self.free = {}
+        self.in_use = 0
+        self.hits = 0
+        self.misses = 0
+        self.peak = 0
+
+    def size_class(self, width, height):
+        return (int(ceil(width / 8.0)) * 8) << 16 | height
+
+    def acquire(self, x, y, width, height):
+        free = self.free.get(self.size_class(width, height))
+        if free:
+            segment = free.pop()
+            segment.reset(x, y)
+            self.hits += 1
+        else:
+            segment = Segment(x, y, width, height)
+            self.misses += 1
+        self.in_use += 1
+        if self.in_use > self.peak:
+            self.peak = self.in_use
+        return segment
+
+    def release(self, segment):
+        self.in_use -= 1
+        key = self.size_class(segment.width, segment.height)
+        free = self.free.get(key)
+        if free is None:
+            free = []
+            self.free[key] = free
+        if len(free) < self.max_free:
+            free.append(segment)
+
+    def stats(self):
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "in_use": self.in_use,
+            "peak": self.peak,
+        }
+
+
+class Sprite:
+    # Pixel art packed as MONO_HMSB rows by Tools/compile_assets.py, ready to
+    # be blitted. FrameBuffer needs a writable buffer so the bytes are copied.
+    def __init__(self, width, height, data):
+        self.width = width
+        self.height = height
+        self.buffer = bytearray(data)
+        self.framebuf = framebuf.FrameBuffer(
+            self.buffer, self.width, self.height, framebuf.MONO_HMSB
+        )
 
 
 class SSD1306:
@@ -53,6 +111,15 @@ class SSD1306:
         self.height = height
         self.external_vcc = external_vcc
         self.pages = self.height // 8
+        # Per page column range touched since the last flush, a page is clean
+        # when its start is past its end
+        self.dirty_start = bytearray(self.pages)
+        self.dirty_end = bytearray(self.pages)
+        self.clear_dirty()
+        # Addressing commands of a flush window, sent as one batch
+        self.window_cmds = bytearray(6)
+        self.window_cmds[0] = SET_COL_ADDR
+        self.window_cmds[3] = SET_PAGE_ADDR
         # Note the subclass must initialize self.framebuf to a framebuffer.
         # This is necessary because the underlying data buffer is different
         # between I2C and SPI implementations (I2C needs an extra byte).
@@ -60,96 +127,144 @@ class SSD1306:
         self.init_display()
 
     def init_display(self):
-        for cmd in (
-            SET_DISP | 0x00,  # off
-            # address setting
-            SET_MEM_ADDR,
-            0x00,  # horizontal
-            # resolution and layout
-            SET_DISP_START_LINE | 0x00,
-            SET_SEG_REMAP | 0x01,  # column addr 127 mapped to SEG0
-            SET_MUX_RATIO,
-            self.height - 1,
-            SET_COM_OUT_DIR | 0x08,  # scan from COM[N] to COM0
-            SET_DISP_OFFSET,
-            0x00,
-            SET_COM_PIN_CFG,
-            0x02 if self.height == 32 else 0x12,
-            # timing and driving scheme
-            SET_DISP_CLK_DIV,
-            0x80,
-            SET_PRECHARGE,
-            0x22 if self.external_vcc else 0xF1,
-            SET_VCOM_DESEL,
-            0x30,  # 0.83*Vcc
-            # display
-            SET_CONTRAST,
-            0xFF,  # maximum
-            SET_ENTIRE_ON,  # output follows RAM contents
-            SET_NORM_INV,  # not inverted
-            # charge pump
-            SET_CHARGE_PUMP,
-            0x10 if self.external_vcc else 0x14,
-            SET_DISP | 0x01,
-        ):  # on
-            self.write_cmd(cmd)
+        self.write_cmds(
+            bytes(
+                (
+                    SET_DISP | 0x00,  # off
+                    # address setting
+                    SET_MEM_ADDR,
+                    0x00,  # horizontal
+                    # resolution and layout
+                    SET_DISP_START_LINE | 0x00,
+                    SET_SEG_REMAP | 0x01,  # column addr 127 mapped to SEG0
+                    SET_MUX_RATIO,
+                    self.height - 1,
+                    SET_COM_OUT_DIR | 0x08,  # scan from COM[N] to COM0
+                    SET_DISP_OFFSET,
+                    0x00,
+                    SET_COM_PIN_CFG,
+                    0x02 if self.height == 32 else 0x12,
+                    # timing and driving scheme
+                    SET_DISP_CLK_DIV,
+                    0x80,
+                    SET_PRECHARGE,
+                    0x22 if self.external_vcc else 0xF1,
+                    SET_VCOM_DESEL,
+                    0x30,  # 0.83*Vcc
+                    # display
+                    SET_CONTRAST,
+                    0xFF,  # maximum
+                    SET_ENTIRE_ON,  # output follows RAM contents
+                    SET_NORM_INV,  # not inverted
+                    # charge pump
+                    SET_CHARGE_PUMP,
+                    0x10 if self.external_vcc else 0x14,
+                    SET_DISP | 0x01,  # on
+                )
+            )
+        )
         self.fill(0)
         self.show()
 
+    def set_buffer(self, buffer, fbuf, frame_view):
+        # Show another buffer made by new_buffer, e.g. a pre-rendered page
+        self.buffer = buffer
+        self.framebuf = fbuf
+        self.frame_view = frame_view
+        self.mark_dirty(0, 0, self.width, self.height)
+
     def poweroff(self):
         self.write_cmd(SET_DISP | 0x00)
 
     def contrast(self, contrast):
-        self.write_cmd(SET_CONTRAST)
-        self.write_cmd(contrast)
+        self.write_cmds(bytes((SET_CONTRAST, contrast)))
 
     def invert(self, invert):
         self.write_cmd(SET_NORM_INV | (invert & 1))
 
-    def show(self, start_page=0, end_page=7):
-        x0 = 0
-        x1 = self.width - 1
+    def clear_dirty(self):
+        for page in range(self.pages):
+            self.dirty_start[page] = 0xFF
+            self.dirty_end[page] = 0
+
+    def mark_dirty(self, x, y, width, height):
+        # Clip the zone to the screen
+        x0 = max(x, 0)
+        x1 = min(x + width, self.width) - 1
+        y0 = max(y, 0)
+        y1 = min(y + height, self.height) - 1
+        if x1 < x0 or y1 < y0:
+            return
+        for page in range(y0 // 8, y1 // 8 + 1):
+            if x0 < self.dirty_start[page]:
+                self.dirty_start[page] = x0
+            if x1 > self.dirty_end[page]:
+                self.dirty_end[page] = x1
+
+    def is_dirty(self):
+        for page in range(self.pages):
+            if self.dirty_start[page] <= self.dirty_end[page]:
+                return True
+        return False
+
+    def set_window(self, x0, x1, start_page, end_page):
         if self.width == 64:
             # displays with width of 64 pixels are shifted by 32
             x0 += 32
             x1 += 32
-        self.write_cmd(SET_COL_ADDR)
-        self.write_cmd(x0)
-        self.write_cmd(x1)
-        self.write_cmd(SET_PAGE_ADDR)
-        self.write_cmd(start_page)
-        self.write_cmd(end_page)
+        self.window_cmds[1] = x0
+        self.window_cmds[2] = x1
+        self.window_cmds[4] = start_page
+        self.window_cmds[5] = end_page
+        self.write_cmds(self.window_cmds)
+
+    def write_cmds(self, cmds):
+        for cmd in cmds:
+            self.write_cmd(cmd)
+
+    def show_all(self):
+        self.set_window(0, self.width - 1, 0, self.pages - 1)
         self.write_framebuf()
+        self.clear_dirty()
+
+    def show(self):
+        # Only send the columns of the pages touched since the last flush
+        full = True
+        for page in range(self.pages):
+            if self.dirty_start[page] != 0 or self.dirty_end[page] != self.width - 1:
+                full = False
+                break
+        if full:
+            self.show_all()
+            return
+
+        for page in range(self.pages):
+            x0 = self.dirty_start[page]
+            x1 = self.dirty_end[page]
+            if x0 <= x1:
+                self.write_window(page, x0, x1)
+        self.clear_dirty()
+
+    def write_window(self, page, x0, x1, frame=None):
+        # frame defaults to the pixel bytes of the framebuffer
+        self.set_window(x0, x1, page, page)
+        start = page * self.width
+        self.write_data(start + x0, start + x1 + 1, frame)
 
     def merge_framebuff(self, segment):
         self.framebuf.blit(segment.framebuf, segment.x, segment.y)
-        self.show()
-
-    def reset_zone(self, segment):
-        self.framebuf.fill_rect(segment.x, segment.y, segment.width, segment.height, 0)
+        self.mark_dirty(segment.x, segment.y, segment.width, segment.height)
 
     def fill(self, col):
         self.framebuf.fill(col)
+        self.mark_dirty(0, 0, self.width, self.height)
 
-    def pixel(self, segment, x, y, col):
-        segment.framebuf.pixel(x, y, col)
+    def sprite(self, segment, sprite, x=0, y=0):
+        segment.framebuf.blit(sprite.framebuf, x, y)
 
     def text(self, segment, string, col=1):
         segment.framebuf.text(string, 0, 0, col)
 
-    def line(self, segment, x2, y2, col=1):
-        segment.framebuf.line(0, 0, x2, y2, col)
-
-    def scroll(self, segment):
-        # We could and dx, dy to change the direction
-        segment.framebuf.scroll(-1, 0)
-        segment.pixel_scrolled += 1
-
-        # If we are done scrolling set reset
-        if segment.pixel_scrolled > segment.width:
-            print("scroll reset")
-            segment.needs_reset = True
-
     def rect(self, segment, w, h, fill=True, col=1):
         if fill:
             segment.framebuf.fill_rect(0, 0, w, h, col)
@@ -162,6 +277,9 @@ class SSD1306_I2C(SSD1306):
         self.i2c = i2c
         self.addr = addr
         self.temp = bytearray(2)
+        # Command batches share one transaction behind a Co=0, D/C#=0 byte
+        self.cmd_buffer = bytearray(32)
+        self.cmd_view = memoryview(self.cmd_buffer)
         # Add an extra byte to the data buffer to hold an I2C data/command byte
         # to use hardware-compatible I2C transactions.  A memoryview of the
         # buffer is used to mask this byte from the framebuffer operations
@@ -172,17 +290,106 @@ class SSD1306_I2C(SSD1306):
         self.framebuf = framebuf.FrameBuffer1(
             memoryview(self.buffer)[1:], width, height
         )
+        # Scratch buffer holding one page worth of data behind the same
+        # data/command byte, used to send partial windows
+        self.page_buffer = bytearray(width + 1)
+        self.page_buffer[0] = 0x40
+        self.page_view = memoryview(self.page_buffer)
+        self.frame_view = memoryview(self.buffer)[1:]
         super().__init__(width, height, external_vcc)
 
+    def new_buffer(self):
+        buffer = bytearray(((self.height // 8) * self.width) + 1)
+        buffer[0] = 0x40  # Co=0, D/C=1
+        frame_view = memoryview(buffer)[1:]
+        fbuf = framebuf.FrameBuffer1(frame_view, self.width, self.height)
+        return buffer, fbuf, frame_view
+
     def write_cmd(self, cmd):
         self.temp[0] = 0x80  # Co=1, D/C#=0
         self.temp[1] = cmd
         self.i2c.writeto(self.addr, self.temp)
 
+    def write_cmds(self, cmds):
+        # Batches longer than the buffer are split over several transactions
+        chunk = len(self.cmd_buffer) - 1
+        if len(cmds) > chunk:
+            for start in range(0, len(cmds), chunk):
+                self.write_cmds(cmds[start : start + chunk])
+            return
+        size = len(cmds)
+        self.cmd_buffer[0] = 0x00  # Co=0, D/C#=0
+        self.cmd_view[1 : size + 1] = cmds
+        self.i2c.writeto(self.addr, self.cmd_view[: size + 1])
+
     def write_framebuf(self):
         # Blast out the frame buffer using a single I2C transaction to support
         # hardware I2C interfaces.
         self.i2c.writeto(self.addr, self.buffer)
 
+    def write_data(self, start, end, frame=None):
+        # Send the frame bytes in [start, end) of a single page
+        if frame is None:
+            frame = self.frame_view
+        size = end - start
+        self.page_view[1 : size + 1] = frame[start:end]
+        self.i2c.writeto(self.addr, self.page_view[: size + 1])
+
     def poweron(self):
         pass
+
+
+class SSD1306_SPI(SSD1306):
+    def __init__(
+        self, width, height, spi, dc, res, cs, external_vcc=False, baudrate=10000000
+    ):
+        self.rate = baudrate
+        dc.init(dc.OUT, value=0)
+        res.init(res.OUT, value=0)
+        cs.init(cs.OUT, value=1)
+        self.spi = spi
+        self.dc = dc
+        self.res = res
+        self.cs = cs
+        # No data/command byte on SPI, the DC pin selects it
+        self.buffer = bytearray((height // 8) * width)
+        self.frame_view = memoryview(self.buffer)
+        self.framebuf = framebuf.FrameBuffer1(self.buffer, width, height)
+        self.temp = bytearray(1)
+        super().__init__(width, height, external_vcc)
+
+    def new_buffer(self):
+        buffer = bytearray((self.height // 8) * self.width)
+        fbuf = framebuf.FrameBuffer1(buffer, self.width, self.height)
+        return buffer, fbuf, memoryview(buffer)
+
+    def transfer(self, dc, data):
+        self.spi.init(baudrate=self.rate, polarity=0, phase=0)
+        self.cs(1)
+        self.dc(dc)
+        self.cs(0)
+        self.spi.write(data)
+        self.cs(1)
+
+    def write_cmd(self, cmd):
+        self.temp[0] = cmd
+        self.transfer(0, self.temp)
+
+    def write_cmds(self, cmds):
+        self.transfer(0, cmds)
+
+    def write_framebuf(self):
+        # The whole frame goes out in one SPI transfer
+        self.transfer(1, self.buffer)
+
+    def write_data(self, start, end, frame=None):
+        if frame is None:
+            frame = self.frame_view
+        self.transfer(1, frame[start:end])
+
+    def poweron(self):
+        self.res(1)
+        time.sleep_ms(1)
+        self.res(0)
+        time.sleep_ms(10)
+        self.res(1)
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+
+# Compiles the sprite definitions and fonts into a module of bytes constants.
+# Once frozen in the firmware (or kept as .mpy in flash) the board reads them
+# as read only data instead of parsing pixel art strings at boot.
+
+# Usage:
+#   python3 Tools/compile_assets.py [Tools/assets/sprites.txt] [Sources/assets.py]
+
+import os
+import sys
+
+from make_font import clock_glyphs
+from make_font import pack_font
+from make_font import pack_rows
+
+TOOLS_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_SPRITES = os.path.join(TOOLS_DIR, "assets", "sprites.txt")
+DEFAULT_OUTPUT = os.path.normpath(os.path.join(TOOLS_DIR, "..", "Sources", "assets.py"))
+
+# Fonts built into the module, name -> (glyphs, height)
+FONTS = {"clock": clock_glyphs}
+
+
+def read_sprites(path):
+    sprites = {}
+    name = None
+    with open(path) as sprite_file:
+        for line in sprite_file:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            if line.startswith("sprite "):
+                name = line.split()[1]
+                sprites[name] = []
+            else:
+                sprites[name].append(line.replace("1", "#").replace("0", "."))
+    return sprites
+
+
+def bytes_literal(data, indent):
+    # Split long constants over several lines of implicitly joined literals
+    chunks = []
+    for start in range(0, len(data), 16):
+        chunk = "".join("\\x%02x" % byte for byte in data[start : start + 16])
+        chunks.append(indent + 'b"' + chunk + '"')
+    if len(chunks) == 1:
+        return chunks[0].strip()
+    return "(\n" + "\n".join(chunks) + "\n" + indent[4:] + ")"
+
+
+def compile_assets(sprites_path, output_path):
+    sprites = read_sprites(sprites_path)
+    lines = [
+        "# Generated by Tools/compile_assets.py from Tools/assets, do not edit",
+        "",
+        "# Sprites, name -> (width, height, MONO_HMSB rows)",
+        "SPRITES = {",
+    ]
+    for name in sorted(sprites):
+        rows = sprites[name]
+        data = bytes_literal(pack_rows(rows), " " * 12)
+        lines.append('    "%s": (%d, %d, %s),' % (name, len(rows[0]), len(rows), data))
+    lines += ["}", "", "# Fonts in the Sources/font.py layout", "FONTS = {"]
+    for name in sorted(FONTS):
+        glyphs, height = FONTS[name]()
+        data = bytes_literal(pack_font(glyphs, height), " " * 8)
+        lines.append('    "%s": %s,' % (name, data))
+    lines += ["}", ""]
+
+    with open(output_path, "w") as output:
+        output.write("\n".join(lines))
+    print("Wrote", output_path, len(sprites), "sprites,", len(FONTS), "fonts")
+
+
+def main(argv):
+    sprites_path = argv[1] if len(argv) > 1 else DEFAULT_SPRITES
+    output_path = argv[2] if len(argv) > 2 else DEFAULT_OUTPUT
+    compile_assets(sprites_path, output_path)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
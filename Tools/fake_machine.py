@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+
+# Host side stand-in for the parts of the machine module used by Sources.
+# Install it before importing the board code:
+#   import sys; sys.path.append("Tools")
+#   import fake_machine; sys.modules["machine"] = fake_machine
+# Then drive inputs by hand:
+#   pin = fake_machine.Pin.pins[0]; pin.press(); fake_machine.Timer.expire_all()
+
+import time
+
+
+def idle():
+    # On the board an idle ends with the next interrupt, the system tick at
+    # the latest
+    time.sleep(0.001)
+
+
+class Pin:
+    IN = 0
+    OUT = 1
+    PULL_UP = 2
+    IRQ_FALLING = 1
+    IRQ_RISING = 2
+
+    # Pins created so far, by number
+    pins = {}
+
+    def __init__(self, number=None, mode=None, pull=None, value=None):
+        self.number = number
+        self.state = 1 if pull == Pin.PULL_UP else 0
+        if value is not None:
+            self.state = value
+        self.trigger = 0
+        self.handler = None
+        if number is not None:
+            Pin.pins[number] = self
+
+    def init(self, mode=None, pull=None, value=None):
+        if value is not None:
+            self.state = value
+
+    def value(self, value=None):
+        if value is None:
+            return self.state
+        self.set_level(1 if value else 0)
+
+    def __call__(self, value=None):
+        return self.value(value)
+
+    def irq(self, trigger=0, handler=None):
+        self.trigger = trigger
+        self.handler = handler
+
+    def set_level(self, level):
+        # Change the input level and raise the IRQ like the hardware would
+        previous = self.state
+        self.state = level
+        if self.handler is None or previous == level:
+            return
+        if (level and self.trigger & Pin.IRQ_RISING) or (
+            not level and self.trigger & Pin.IRQ_FALLING
+        ):
+            self.handler(self)
+
+    def press(self, bounces=0):
+        # Active low button, optionally bouncing before settling
+        for _ in range(bounces):
+            self.set_level(0)
+            self.set_level(1)
+        self.set_level(0)
+
+    def release(self):
+        self.set_level(1)
+
+
+class Timer:
+    ONE_SHOT = 0
+    PERIODIC = 1
+
+    # Armed timers, fired by expire_all
+    armed = []
+
+    def __init__(self, timer_id=0):
+        self.timer_id = timer_id
+        self.callback = None
+
+    def init(self, mode=ONE_SHOT, period=0, callback=None):
+        self.mode = mode
+        self.period = period
+        self.callback = callback
+        if self not in Timer.armed:
+            Timer.armed.append(self)
+
+    def deinit(self):
+        if self in Timer.armed:
+            Timer.armed.remove(self)
+
+    @classmethod
+    def expire_all(cls):
+        for timer in list(cls.armed):
+            if timer.mode == Timer.ONE_SHOT:
+                cls.armed.remove(timer)
+            timer.callback(timer)
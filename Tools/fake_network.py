@@ -0,0 +1,29 @@
+#!/usr/bin/env python3
+
+# Host side stand-in for the network module, a station that is always
+# connected, so Sources/internet.py runs on the MicroPython unix port.
+# Install it before importing internet:
+#   import sys; sys.path.append("Tools")
+#   import fake_network; sys.modules["network"] = fake_network
+
+STA_IF = 0
+
+
+class WLAN:
+    def __init__(self, interface):
+        self.interface = interface
+
+    def active(self, active=None):
+        return True
+
+    def isconnected(self):
+        return True
+
+    def connect(self, ssid, password):
+        pass
+
+    def scan(self):
+        return []
+
+    def ifconfig(self):
+        return ("127.0.0.1", "255.0.0.0", "127.0.0.1", "127.0.0.1")
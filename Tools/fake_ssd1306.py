@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+
+# Host side stand-in for an SSD1306 wired on SPI.
+# FakePin and FakeSPI replace machine.Pin and machine.SPI so SSD1306_SPI can
+# run on the MicroPython unix port. The fake decodes the command stream like
+# the controller does and keeps a copy of its display RAM.
+
+# Usage (MicroPython unix port, from the repository root):
+#   import sys; sys.path.append("Sources"); sys.path.append("Tools")
+#   from fake_ssd1306 import FakePin, FakeSPI
+#   from ssd1306 import SSD1306_SPI
+#   dc = FakePin()
+#   spi = FakeSPI(128, 64, dc)
+#   oled = SSD1306_SPI(128, 64, spi, dc, FakePin(), FakePin())
+#   oled.fill(1); oled.show(); print(spi.render())
+
+from fake_machine import Pin as FakePin
+
+SET_COL_ADDR = 0x21
+SET_PAGE_ADDR = 0x22
+
+# Number of argument bytes following the commands that take some
+CMD_ARGS = {
+    0x20: 1,
+    0x21: 2,
+    0x22: 2,
+    0x81: 1,
+    0x8D: 1,
+    0xA8: 1,
+    0xD3: 1,
+    0xD5: 1,
+    0xD9: 1,
+    0xDA: 1,
+    0xDB: 1,
+}
+
+
+class FakeSPI:
+    def __init__(self, width, height, dc):
+        self.width = width
+        self.pages = height // 8
+        self.dc = dc
+        self.ram = bytearray(width * self.pages)
+        self.col_start = 0
+        self.col_end = width - 1
+        self.page_start = 0
+        self.page_end = self.pages - 1
+        self.col = 0
+        self.page = 0
+        self.pending = []
+        # Bus statistics
+        self.transfers = 0
+        self.cmd_bytes = 0
+        self.data_bytes = 0
+
+    def init(self, baudrate=None, polarity=None, phase=None):
+        pass
+
+    def write(self, buf):
+        self.transfers += 1
+        if self.dc.value():
+            self.data_bytes += len(buf)
+            for byte in buf:
+                self.write_ram(byte)
+        else:
+            self.cmd_bytes += len(buf)
+            for byte in buf:
+                self.write_cmd(byte)
+
+    def write_cmd(self, byte):
+        self.pending.append(byte)
+        if len(self.pending) <= CMD_ARGS.get(self.pending[0], 0):
+            return
+        cmd = self.pending[0]
+        if cmd == SET_COL_ADDR:
+            self.col_start, self.col_end = self.pending[1], self.pending[2]
+            self.col = self.col_start
+        elif cmd == SET_PAGE_ADDR:
+            self.page_start, self.page_end = self.pending[1], self.pending[2]
+            self.page = self.page_start
+        self.pending = []
+
+    def write_ram(self, byte):
+        # Horizontal addressing mode, wraps inside the current window
+        self.ram[self.page * self.width + self.col] = byte
+        self.col += 1
+        if self.col > self.col_end:
+            self.col = self.col_start
+            self.page += 1
+            if self.page > self.page_end:
+                self.page = self.page_start
+
+    def pixel(self, x, y):
+        return (self.ram[(y // 8) * self.width + x] >> (y & 0x07)) & 1
+
+    def render(self):
+        lines = []
+        for y in range(self.pages * 8):
+            line = ""
+            for x in range(self.width):
+                line += "#" if self.pixel(x, y) else "."
+            lines.append(line)
+        return "\n".join(lines)
+
+    def reset_stats(self):
+        self.transfers = 0
+        self.cmd_bytes = 0
+        self.data_bytes = 0
@@ -0,0 +1,489 @@
+#!/usr/bin/env micropython
+
+# Checks of the board code, the JSON field parser included, against the
+# host stand-ins, for the MicroPython unix port. Run from the repository root:
+#   micropython Tools/host_checks.py
+# The HTTP checks run when the URL of Tools/http_stand_in.py is given:
+#   python3 Tools/http_stand_in.py 8080 &
+#   micropython Tools/host_checks.py http://127.0.0.1:8080
+# Exits with 1 when a check fails.
+
+import sys
+
+sys.path.append("Sources")
+sys.path.append("Libs")
+sys.path.append("Tools")
+sys.path.append(".")
+
+import consts_exemple
+import fake_machine
+import fake_network
+
+sys.modules["consts"] = consts_exemple
+sys.modules["machine"] = fake_machine
+sys.modules["network"] = fake_network
+
+# Libs
+import uarequest
+import uasyncio as asyncio
+import urequest
+
+# Local libs
+from buttons import BUTTON_PRESSED
+from buttons import BUTTON_RELEASED
+from buttons import Buttons
+from fake_ssd1306 import FakePin
+from fake_ssd1306 import FakeSPI
+from internet import Network
+from jsonfields import JsonFields
+from marquee import Marquee
+from screen import Screen_element
+from ssd1306 import Segment
+from ssd1306 import SegmentPool
+from ssd1306 import SSD1306_SPI
+
+WIDTH = 128
+HEIGHT = 64
+
+# Root of the HTTP stand-in, from the command line
+BASE_URL = None
+# Stand-in Drive file and its first mail
+MAIL_PATH = "/drive/v2/files/mails"
+MAIL = ["0", "alice@example.com", "Lunch tomorrow?"]
+
+
+def new_oled():
+    # SSD1306 on the fake bus, initialized and with the bus counters cleared
+    dc = FakePin()
+    spi = FakeSPI(WIDTH, HEIGHT, dc)
+    oled = SSD1306_SPI(WIDTH, HEIGHT, spi, dc, FakePin(), FakePin())
+    spi.reset_stats()
+    return oled, spi
+
+
+def check_full_flush():
+    oled, spi = new_oled()
+    oled.fill(1)
+    oled.show()
+    assert spi.data_bytes == WIDTH * HEIGHT // 8, spi.data_bytes
+    assert spi.ram == oled.buffer
+    assert spi.render().count("#") == WIDTH * HEIGHT
+
+
+def check_dirty_window_flush():
+    # An 8x8 segment across two pages only sends its 8 columns of each page
+    oled, spi = new_oled()
+    segment = Segment(10, 20, 8, 8)
+    segment.framebuf.fill(1)
+    oled.merge_framebuff(segment)
+    oled.show()
+    assert spi.data_bytes == 2 * 8, spi.data_bytes
+    assert spi.ram == oled.buffer
+    for y in range(HEIGHT):
+        for x in range(WIDTH):
+            lit = 10 <= x < 18 and 20 <= y < 28
+            assert spi.pixel(x, y) == lit, (x, y)
+
+
+def check_clean_flush():
+    oled, spi = new_oled()
+    oled.show()
+    assert spi.transfers == 0, spi.transfers
+
+
+def check_buffer_swap():
+    # A pre-rendered page goes out whole and replaces the display RAM
+    oled, spi = new_oled()
+    buffer, fbuf, frame_view = oled.new_buffer()
+    fbuf.text("page", 0, 0, 1)
+    oled.set_buffer(buffer, fbuf, frame_view)
+    oled.show()
+    assert spi.data_bytes == WIDTH * HEIGHT // 8, spi.data_bytes
+    assert spi.ram == buffer
+
+
+def check_marquee_strips():
+    # Texts of close lengths scroll on the same pooled strip, one at a time
+    pool = SegmentPool()
+    window = Segment(0, 16, WIDTH, 8)
+    for text in ("alice@example.com: Lunch?", "bob@example.com: Lunch soon?"):
+        marquee = Marquee(window, text, 30, 30, pool)
+        assert marquee.scrolling
+        marquee.release()
+    stats = pool.stats()
+    assert (stats["misses"], stats["hits"], stats["peak"]) == (1, 1, 1), stats
+    assert stats["in_use"] == 0, stats
+
+
+DISPLAY_CHECKS = (
+    check_full_flush,
+    check_dirty_window_flush,
+    check_clean_flush,
+    check_buffer_swap,
+    check_marquee_strips,
+)
+
+
+def bounce(pin, bounces=0):
+    # Press then release, each settling before the debounce timer fires
+    pin.press(bounces)
+    fake_machine.Timer.expire_all()
+    pin.release()
+    fake_machine.Timer.expire_all()
+
+
+def check_debounced_events():
+    buttons = Buttons((100, 101))
+    bounce(fake_machine.Pin.pins[101], bounces=3)
+    assert buttons.get() == (1, BUTTON_PRESSED)
+    assert buttons.get() == (1, BUTTON_RELEASED)
+    assert buttons.get() is None
+
+
+def check_ring_overflow():
+    # A ring of 4 holds 3 events, the later ones are counted as dropped
+    buttons = Buttons((102,), size=4)
+    for _ in range(3):
+        bounce(fake_machine.Pin.pins[102])
+    assert buttons.dropped == 3, buttons.dropped
+    assert buttons.get() == (0, BUTTON_PRESSED)
+
+
+def check_wait():
+    buttons = Buttons((103,))
+    assert not buttons.wait(20)
+    fake_machine.Pin.pins[103].press()
+    fake_machine.Timer.expire_all()
+    assert buttons.wait(1000)
+    assert buttons.get() == (0, BUTTON_PRESSED)
+
+
+BUTTON_CHECKS = (
+    check_debounced_events,
+    check_ring_overflow,
+    check_wait,
+)
+
+
+class PieceStream:
+    # Body handed out at most size bytes per readinto()
+    def __init__(self, data, size):
+        self.data = data
+        self.size = size
+        self.pos = 0
+        self.reads = 0
+
+    def readinto(self, buf):
+        self.reads += 1
+        n = min(self.size, len(buf), len(self.data) - self.pos)
+        buf[:n] = self.data[self.pos : self.pos + n]
+        self.pos += n
+        return n
+
+
+def extract(data, fields, size=64):
+    return JsonFields().extract(PieceStream(data, size), fields)
+
+
+NESTED = (
+    b'{"skip": {"s": "}]\\"{[", "list": [1, {"x": [2, 3]}, null]},'
+    b' "a\\"b": true, "\\u00e9t\\u00e9": -1.5e2,'
+    b' "list": [{"x": 0}, [], {"x": {"y": "z"}}], "last": "end"}'
+)
+NESTED_FIELDS = {
+    "quoted": ('a"b',),
+    "escaped": ("été",),
+    "indexed": ("list", 2, "x", "y"),
+    "whole": ("list", 0),
+    "last": ("last",),
+}
+NESTED_RESULT = {
+    "quoted": True,
+    "escaped": -150.0,
+    "indexed": "z",
+    "whole": {"x": 0},
+    "last": "end",
+}
+
+
+def check_fields_byte_by_byte():
+    # Every state of the parser is left between two pieces
+    for size in (1, 2, 7, 64):
+        result = extract(NESTED, NESTED_FIELDS, size)
+        assert result == NESTED_RESULT, (size, result)
+
+
+def check_fields_missing():
+    # A path through a string or past the end of an array is not found
+    fields = {"deep": ("skip", "s", "x"), "out": ("list", 5)}
+    assert extract(NESTED, fields) == {}
+
+
+def check_top_level_scalars():
+    for data, value in (
+        (b"42", 42),
+        (b" -0.5 ", -0.5),
+        (b'"\\"hi\\""', '"hi"'),
+        (b"true", True),
+        (b"null\n", None),
+    ):
+        result = extract(data, {"v": ()}, 1)
+        assert result == {"v": value}, (data, result)
+
+
+def check_truncated_bodies():
+    for data in (b'{"a": {"b": 1', b'{"a": [1, 2', b'"abc', b'{"a"'):
+        try:
+            extract(data, {"c": ("a", "c")}, 3)
+        except ValueError:
+            pass
+        else:
+            assert False, data
+
+
+def check_early_exit_drains():
+    # Once every field is found the rest is read but not parsed
+    data = b'{"id": 7, "items": [' + b'{"k": "v"}, ' * 50 + b"{}]}"
+    stream = PieceStream(data, 16)
+    assert JsonFields().extract(stream, {"id": ("id",)}) == {"id": 7}
+    assert stream.pos == len(data), stream.pos
+
+
+JSON_CHECKS = (
+    check_fields_byte_by_byte,
+    check_fields_missing,
+    check_top_level_scalars,
+    check_truncated_bodies,
+    check_early_exit_drains,
+)
+
+
+def get(path, pool, **kw):
+    return urequest.request("GET", BASE_URL + path, pool=pool, **kw)
+
+
+def check_keep_alive():
+    pool = urequest.ConnectionPool()
+    for _ in range(3):
+        assert get(MAIL_PATH, pool).json()[0] == MAIL
+    stats = pool.stats()
+    assert stats["misses"] == 1 and stats["hits"] == 2, stats
+
+
+def check_redirect():
+    # The redirect and its target share one connection
+    pool = urequest.ConnectionPool()
+    resp = get("/redirect?to=" + MAIL_PATH, pool)
+    assert resp.status_code == 200, resp.status_code
+    assert resp.json()[0] == MAIL
+    stats = pool.stats()
+    assert stats["misses"] == 1 and stats["hits"] == 1, stats
+
+
+def check_chunked():
+    # The connection is reusable once the last chunk is read
+    pool = urequest.ConnectionPool()
+    resp = get(MAIL_PATH + "?chunked=1", pool)
+    assert resp.chunked
+    assert resp.json()[0] == MAIL
+    assert get(MAIL_PATH, pool).json()[0] == MAIL
+    assert pool.stats()["hits"] == 1, pool.stats()
+
+
+def check_not_modified():
+    pool = urequest.ConnectionPool()
+    resp = get(MAIL_PATH, pool)
+    etag = resp.headers["ETag"]
+    assert resp.json()[0] == MAIL
+    resp = get(MAIL_PATH, pool, headers={"If-None-Match": etag})
+    assert resp.status_code == 304, resp.status_code
+    assert resp.read() == b""
+    resp.close()
+    assert pool.stats()["hits"] == 1, pool.stats()
+
+
+def check_gzip():
+    pool = urequest.ConnectionPool()
+    for query in ("", "?chunked=1"):
+        resp = get(MAIL_PATH + query, pool, gzip_window=10)
+        assert resp.gzip
+        assert resp.json()[0] == MAIL
+    assert pool.stats()["hits"] == 1, pool.stats()
+
+
+def check_deadlines():
+    for deadline, limit in (
+        (urequest.Deadline(5, 0.3, 5), "read"),
+        (urequest.Deadline(5, 5, 0.3), "total"),
+    ):
+        try:
+            get("/api/timezone/Europe/Paris?delay=1", None, deadline=deadline)
+        except urequest.RequestTimeout as e:
+            assert e.args[0] == limit, e.args
+        else:
+            assert False, "no " + limit + " timeout"
+
+
+WEATHER_FIELDS = {"temp": ("main", "temp"), "id": ("weather", 0, "id")}
+DRIVE_FIELDS = {"id": ("items", 0, "id"), "trashed": ("items", 0, "labels", "trashed")}
+
+
+def run_async(coro):
+    return asyncio.get_event_loop().run_until_complete(coro)
+
+
+async def aget(path, pool, **kw):
+    return await uarequest.request("GET", BASE_URL + path, pool=pool, **kw)
+
+
+def check_async_keep_alive():
+    # Plain, chunked and redirected bodies share one connection
+    async def requests():
+        pool = uarequest.ConnectionPool()
+        for path in (MAIL_PATH, MAIL_PATH + "?chunked=1", "/redirect?to=" + MAIL_PATH):
+            resp = await aget(path, pool)
+            assert (await resp.json())[0] == MAIL
+            await resp.close()
+        return pool.stats()
+
+    stats = run_async(requests())
+    assert stats["misses"] == 1 and stats["hits"] == 3, stats
+
+
+def check_async_gzip():
+    async def requests():
+        pool = uarequest.ConnectionPool()
+        resp = await aget("/data/2.5/weather", pool, gzip_window=10)
+        assert resp.gzip
+        temp = (await resp.json())["main"]["temp"]
+        await resp.close()
+        resp = await aget("/data/2.5/weather?chunked=1", pool, gzip_window=10)
+        fields = await JsonFields().extract_async(resp, WEATHER_FIELDS)
+        await resp.close()
+        return temp, fields, pool.stats()
+
+    temp, fields, stats = run_async(requests())
+    assert temp == 288.15, temp
+    assert fields == {"temp": 288.15, "id": 803}, fields
+    assert stats["hits"] == 1, stats
+
+
+def check_async_gzip_refill():
+    # Without top ups every inflate step waits for its own input
+    async def no_top_up(body):
+        pass
+
+    async def request():
+        resp = await aget("/data/2.5/weather?chunked=1", None, gzip_window=10)
+        data = await resp.json()
+        await resp.close()
+        return data
+
+    top_up = uarequest.Body.top_up
+    uarequest.Body.top_up = no_top_up
+    try:
+        assert run_async(request())["main"]["temp"] == 288.15
+    finally:
+        uarequest.Body.top_up = top_up
+
+
+def check_async_deadline():
+    async def request():
+        deadline = urequest.Deadline(5, 0.3, 5)
+        await aget("/api/timezone/Europe/Paris?delay=1", None, deadline=deadline)
+
+    try:
+        run_async(request())
+    except urequest.RequestTimeout as e:
+        assert e.args[0] == "read", e.args
+    else:
+        assert False, "no read timeout"
+
+
+def check_overlapping_fields():
+    # Two requests streaming fields at the same time, each with its parser
+    ntw = Network(None, 60)
+    # Identity bodies, every read of the parsers waits on the socket
+    ntw.no_gzip.append(urequest.split_url(BASE_URL)[1])
+    results = {}
+
+    async def fetch(name, path, fields):
+        results[name] = await ntw.request_async("GET", BASE_URL + path, fields=fields)
+
+    async def both():
+        loop = asyncio.get_event_loop()
+        # The drive request runs start to end while the weather body is on
+        # its way
+        slow = "/data/2.5/weather?chunked=1&pause=0.1"
+        loop.create_task(fetch("weather", slow, WEATHER_FIELDS))
+        loop.create_task(fetch("drive", "/drive/v2/files", DRIVE_FIELDS))
+        for _ in range(500):
+            if len(results) == 2:
+                return
+            await asyncio.sleep_ms(10)
+
+    run_async(both())
+    assert results.get("weather") == {"temp": 288.15, "id": 803}, results
+    assert results.get("drive") == {"id": "stand-in-file", "trashed": True}, results
+
+
+class TwoRequests(Screen_element):
+    def fetch(self):
+        weather = yield (
+            "GET",
+            BASE_URL + "/data/2.5/weather",
+            None,
+            {},
+            WEATHER_FIELDS,
+        )
+        drive = yield ("GET", BASE_URL + "/drive/v2/files", None, {}, DRIVE_FIELDS)
+        return weather["temp"], drive["id"]
+
+
+def check_element_get_async():
+    element = TwoRequests(Network(None, 60), None, 60, (5, 5, 10))
+    result = run_async(element.get_async())
+    assert result == (288.15, "stand-in-file"), result
+
+
+HTTP_CHECKS = (
+    check_keep_alive,
+    check_redirect,
+    check_chunked,
+    check_not_modified,
+    check_gzip,
+    check_deadlines,
+    check_async_keep_alive,
+    check_async_gzip,
+    check_async_gzip_refill,
+    check_async_deadline,
+    check_overlapping_fields,
+    check_element_get_async,
+)
+
+
+def run(checks):
+    # Number of failed checks
+    failed = 0
+    for check in checks:
+        try:
+            check()
+            print("ok  ", check.__name__)
+        except Exception as e:
+            failed += 1
+            print("FAIL", check.__name__, repr(e))
+    return failed
+
+
+def main():
+    global BASE_URL
+    failed = run(DISPLAY_CHECKS)
+    failed += run(BUTTON_CHECKS)
+    failed += run(JSON_CHECKS)
+    if len(sys.argv) > 1:
+        BASE_URL = sys.argv[1]
+        failed += run(HTTP_CHECKS)
+    sys.exit(1 if failed else 0)
+
+
+main()
@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+
+# Local stand-in for the HTTP APIs the board polls, to exercise urequest and
+# uarequest without the real services.
+# It answers with canned payloads shaped like the real ones:
+#   /api/timezone/...   worldtimeapi.org time
+#   /data/2.5/weather   openweathermap current weather
+#   /drive/v2/files     Google Drive file list, /drive/v2/files/<id> its content
+#   /redirect?to=<path> 302 to another path
+# Query options on any path:
+#   delay=<seconds>  wait before answering, to see the screen keep running
+#   chunked=1        send the body with chunked transfer encoding
+#   pause=<seconds>  with chunked=1, wait before each chunk, a slow body
+#   close=1          close the connection after the response
+# Bodies carry an ETag, a request with a matching If-None-Match gets a 304.
+# Bodies are gzip compressed when the request accepts it.
+
+# Usage:
+#   python3 Tools/http_stand_in.py [port]
+# then point the URLs in consts.py at it, e.g.
+#   CLOCK_URL = "http://<host ip>:8080/api/timezone/Europe/Paris.json"
+#   WEATHER_URL = "http://<host ip>:8080/data/2.5/weather?"
+
+import gzip
+import json
+import sys
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler
+from http.server import ThreadingHTTPServer
+from urllib.parse import parse_qs
+from urllib.parse import urlsplit
+
+DEFAULT_PORT = 8080
+CHUNK_SIZE = 256
+
+
+def time_payload(query):
+    return {"unixtime": int(time.time()), "timezone": "Europe/Paris"}
+
+
+def weather_payload(query):
+    city = query.get("q", ["paris"])[0]
+    if city == "nowhere":
+        return {"cod": "404", "message": "city not found"}
+    return {
+        "coord": {"lon": 2.35, "lat": 48.85},
+        "weather": [
+            {"id": 803, "main": "Clouds", "description": "broken clouds", "icon": "04d"}
+        ],
+        "base": "stations",
+        "main": {
+            "temp": 288.15,
+            "feels_like": 287.5,
+            "temp_min": 286.0,
+            "temp_max": 290.0,
+            "pressure": 1015,
+            "humidity": 72,
+        },
+        "visibility": 10000,
+        "wind": {"speed": 4.1, "deg": 250},
+        "clouds": {"all": 75},
+        "dt": int(time.time()),
+        "sys": {"country": "FR", "sunrise": 0, "sunset": 0},
+        "name": city.capitalize(),
+        "cod": 200,
+    }
+
+
+def drive_list_payload(query):
+    return {
+        "kind": "drive#fileList",
+        "items": [
+            {
+                "kind": "drive#file",
+                "id": "stand-in-file",
+                "title": "automated_unread_mail.json",
+                "mimeType": "application/json",
+                "labels": {"trashed": True},
+            }
+        ],
+    }
+
+
+def drive_file_payload(query):
+    return [
+        ["0", "alice@example.com", "Lunch tomorrow?"],
+        ["1", "bob@example.com", "Build is green again"],
+    ]
+
+
+ROUTES = (
+    ("/api/timezone/", time_payload),
+    ("/data/2.5/weather", weather_payload),
+    ("/drive/v2/files/", drive_file_payload),
+    ("/drive/v2/files", drive_list_payload),
+)
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        query = parse_qs(url.query)
+        if "delay" in query:
+            time.sleep(float(query["delay"][0]))
+        if url.path == "/redirect":
+            self.send_response(302)
+            self.send_header("Location", query.get("to", ["/"])[0])
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        for prefix, payload in ROUTES:
+            if url.path.startswith(prefix):
+                body = json.dumps(payload(query)).encode()
+                self.send_body(200, body, query)
+                return
+        self.send_body(404, b'{"error": "not found"}', query)
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        self.rfile.read(length)
+        self.do_GET()
+
+    def send_body(self, status, body, query):
+        etag = '"%08x"' % zlib.crc32(body)
+        if status == 200 and self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("ETag", etag)
+        if "gzip" in self.headers.get("Accept-Encoding", ""):
+            body = gzip.compress(body)
+            self.send_header("Content-Encoding", "gzip")
+        if "close" in query:
+            self.send_header("Connection", "close")
+            self.close_connection = True
+        if "chunked" in query:
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            pause = float(query.get("pause", ["0"])[0])
+            for start in range(0, len(body), CHUNK_SIZE):
+                chunk = body[start : start + CHUNK_SIZE]
+                if pause:
+                    self.wfile.flush()
+                    time.sleep(pause)
+                self.wfile.write(b"%x\r\n%s\r\n" % (len(chunk), chunk))
+            self.wfile.write(b"0\r\n\r\n")
+        else:
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+
+def main():
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_PORT
+    server = ThreadingHTTPServer(("", port), Handler)
+    print("Serving on port", port)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
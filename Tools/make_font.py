@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+
+# Packs bitmap glyphs into the font format read by Sources/font.py.
+
+# Usage:
+#   python3 Tools/make_font.py clock Sources/fonts/clock.fnt
+#   python3 Tools/make_font.py my_glyphs.txt Sources/fonts/my_font.fnt
+
+# A glyph file starts with a "height <n>" line, then each glyph is a
+# "char <c>" line followed by <n> rows of "#" (on) and "." (off), all rows of
+# a glyph having the same length which is the glyph width.
+
+import struct
+import sys
+
+FONT_MAGIC = b"AF"
+FONT_VERSION = 1
+HEADER_SIZE = 8
+ENTRY_SIZE = 4
+
+# Seven segment layout of the large clock digits, a to g clockwise then middle
+SEGMENTS = {
+    "0": "abcdef",
+    "1": "bc",
+    "2": "abdeg",
+    "3": "abcdg",
+    "4": "bcfg",
+    "5": "acdfg",
+    "6": "acdefg",
+    "7": "abc",
+    "8": "abcdefg",
+    "9": "abcdfg",
+}
+
+
+def seven_segment(segments, width=10, height=16, thickness=2):
+    rows = [["."] * width for _ in range(height)]
+    middle = height // 2 - thickness // 2
+
+    def fill(x0, y0, x1, y1):
+        for y in range(y0, y1):
+            for x in range(x0, x1):
+                rows[y][x] = "#"
+
+    inner = (thickness, width - thickness)
+    if "a" in segments:
+        fill(inner[0], 0, inner[1], thickness)
+    if "b" in segments:
+        fill(width - thickness, thickness, width, middle)
+    if "c" in segments:
+        fill(width - thickness, middle + thickness, width, height - thickness)
+    if "d" in segments:
+        fill(inner[0], height - thickness, inner[1], height)
+    if "e" in segments:
+        fill(0, middle + thickness, thickness, height - thickness)
+    if "f" in segments:
+        fill(0, thickness, thickness, middle)
+    if "g" in segments:
+        fill(inner[0], middle, inner[1], middle + thickness)
+    return ["".join(row) for row in rows]
+
+
+def clock_glyphs(height=16):
+    glyphs = {}
+    for char in SEGMENTS:
+        glyphs[char] = seven_segment(SEGMENTS[char], height=height)
+    glyphs[" "] = ["...."] * height
+    glyphs["-"] = seven_segment("g", width=6, height=height)
+    dot = [".."] * height
+    glyphs["."] = dot[:-2] + ["##", "##"]
+    colon = list(dot)
+    for y in (4, 5, height - 6, height - 5):
+        colon[y] = "##"
+    glyphs[":"] = colon
+    slash = []
+    for y in range(height):
+        x = 5 - y * 6 // height
+        slash.append("." * x + "#" + "." * (5 - x))
+    glyphs["/"] = slash
+    return glyphs, height
+
+
+def read_glyphs(path):
+    glyphs = {}
+    height = None
+    char = None
+    with open(path) as glyph_file:
+        for line in glyph_file:
+            line = line.rstrip("\n")
+            if not line.strip():
+                continue
+            if line.startswith("height "):
+                height = int(line.split()[1])
+            elif line.startswith("char "):
+                char = line[5:6] or " "
+                glyphs[char] = []
+            else:
+                glyphs[char].append(line.strip())
+    return glyphs, height
+
+
+def pack_rows(rows):
+    width = len(rows[0])
+    stride = (width + 7) // 8
+    data = bytearray(stride * len(rows))
+    for y, row in enumerate(rows):
+        if len(row) != width:
+            raise ValueError("Uneven glyph rows: " + repr(rows))
+        for x, pixel in enumerate(row):
+            if pixel == "#":
+                # MONO_HMSB, leftmost pixel in the least significant bit
+                data[y * stride + x // 8] |= 1 << (x & 0x07)
+    return bytes(data)
+
+
+def pack_font(glyphs, height):
+    codes = sorted(ord(char) for char in glyphs)
+    first = codes[0]
+    count = codes[-1] - first + 1
+    if count > 255:
+        raise ValueError("Too many glyphs")
+
+    header = FONT_MAGIC + struct.pack("<BBBBH", FONT_VERSION, height, first, count, 0)
+    index = bytearray()
+    data = bytearray()
+    offset = HEADER_SIZE + count * ENTRY_SIZE
+    for code in range(first, first + count):
+        rows = glyphs.get(chr(code))
+        if rows is None:
+            index += struct.pack("<HBB", 0, 0, 0)
+            continue
+        if len(rows) != height:
+            raise ValueError("Glyph %r is not %d rows high" % (chr(code), height))
+        bitmap = pack_rows(rows)
+        index += struct.pack("<HBB", offset + len(data), len(rows[0]), 0)
+        data += bitmap
+    return header + bytes(index) + bytes(data)
+
+
+def main(argv):
+    if len(argv) != 3:
+        print("Usage: make_font.py <clock|glyphs.txt> <output.fnt>")
+        return 1
+    if argv[1] == "clock":
+        glyphs, height = clock_glyphs()
+    else:
+        glyphs, height = read_glyphs(argv[1])
+    font = pack_font(glyphs, height)
+    with open(argv[2], "wb") as font_file:
+        font_file.write(font)
+    print("Wrote", argv[2], len(font), "bytes,", len(glyphs), "glyphs")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
@@ -1,20 +1,52 @@
 # Main
 MAIN_CYCLE_TIME = 0.05
+MAIN_ASYNC = False  # run the elements and the screen as uasyncio tasks
+
+# Screen
+SCREEN_BUS = "i2c"  # "i2c" or "spi"
+SCREEN_SPI_ID = 1
+SCREEN_SPI_BAUDRATE = 10000000
+SCREEN_SPI_PINS = {"sck": 18, "mosi": 23, "dc": 16, "res": 17, "cs": 5}
+SCREEN_MARQUEE_SPEED = 20
+SCREEN_MAX_FPS = 25
+SCREEN_FONTS = {"clock": "Sources/fonts/clock.fnt"}
+SCREEN_PAGE_TIME = 0  # seconds between automatic page switches, 0 to disable
+
+# Buttons, active low, pressed pulls the pin to ground
+# Empty to disable, e.g. (32, 33) for two buttons. Avoid strap pins such as 0
+# (BOOT), held low at reset it keeps the board in the bootloader
+BUTTON_PINS = ()
+BUTTON_DEBOUNCE_MS = 20
+BUTTON_NEXT_PAGE = 0  # index in BUTTON_PINS
+BUTTON_SCROLL = 1
 
 # Wifi
 NTW_LIST = {"SSID1": "password1", "SSID2": "password2"}
 NTW_CHECK_TIME = 30
+NTW_POOL_MAX_PER_HOST = 2  # idle keep alive connections kept per host
+NTW_POOL_MAX_IDLE = 4  # idle keep alive connections kept overall
+NTW_POOL_IDLE_TIMEOUT = 30  # seconds before an idle connection is dropped
+NTW_DNS_TTL = 300  # seconds a resolved host is reused
+NTW_DNS_NEGATIVE_TTL = 30  # seconds a failed lookup is not retried
+NTW_CACHE_BUDGET = 4096  # bytes of revalidatable responses kept
+# gzip responses, inflated through a 2**NTW_GZIP_WINDOW bytes window, 0 to disable
+# Servers compress with 15 (32 KB), 10 (1 KB) covers bodies up to 1 KB such as
+# the clock and weather ones. A host whose body refers further back than the
+# window is asked for uncompressed bodies from then on
+NTW_GZIP_WINDOW = 10
 
 # Clock
 CLOCK_URL = "http://worldtimeapi.org/api/timezone/Europe/Paris.json"
 CLOCK_UTC_OFFSET = 2
 CLOCK_TIME_CHECK = 600
+CLOCK_TIMEOUTS = (5, 5, 10)  # connect, read and total seconds per request
 
 # Weather
 WEATHER_URL = "http://api.openweathermap.org/data/2.5/weather?"
 WEATHER_API_KEY = "API_KEY"
 WEATHER_CITY = "paris"
 WEATHER_TIME_CHECK = 300
+WEATHER_TIMEOUTS = (5, 5, 15)
 
 # Google api
 GOOGLE_CLIENT_ID = "YOUR_GOOGLE_CLIENT_ID"
@@ -25,3 +57,4 @@ GOOGLE_OAUTH_TOKEN_URL = "https://www.googleapis.com/oauth2/v4/token"
 GOOGLE_REFRESH_TOKEN_FILE = "refresh_token.txt"
 GOOGLE_DRIVE_URL = "https://www.googleapis.com/drive/v2/files"
 GOOGLE_TIME_CHECK = 5
+GOOGLE_TIMEOUTS = (10, 10, 20)  # TLS handshakes take seconds on the ESP32
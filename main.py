@@ -1,5 +1,7 @@
 # Libs
+import gc
 import machine
+import uasyncio as asyncio
 import utime
 import sys
 
@@ -8,23 +10,24 @@ sys.path.append("Sources")
 # Local libs
 # import esp32
 # import _thread
-# import uasyncio as asyncio
 # from google import Google
 from screen import Screen_element
 from screen import Screen_Handler
 from internet import Network
+from buttons import Buttons
+from buttons import BUTTON_PRESSED
 import consts as const
 
 
 class Clock(Screen_element):
     def __init__(self, ntw, sc, max_time_check):
-        Screen_element.__init__(self, ntw, sc, max_time_check)
+        Screen_element.__init__(self, ntw, sc, max_time_check, const.CLOCK_TIMEOUTS)
         self.url = const.CLOCK_URL
         self.tm = None
 
-    def get(self):
+    def fetch(self):
         print("Getting time")
-        time_data = self.ntw.request("GET", self.url)
+        time_data = yield ("GET", self.url)
         print("Time response =", time_data)
         if time_data is not None:
             unix_timestamp = (
@@ -42,7 +45,7 @@ class Clock(Screen_element):
 
 class Weather(Screen_element):
     def __init__(self, ntw, sc, max_time_check):
-        Screen_element.__init__(self, ntw, sc, max_time_check)
+        Screen_element.__init__(self, ntw, sc, max_time_check, const.WEATHER_TIMEOUTS)
         self.current_temperature = None
         self.complete_url = (
             const.WEATHER_URL
@@ -61,18 +64,27 @@ class Weather(Screen_element):
             8: "clouds",
             9: "rain",
         }
+        # Only these values are read out of the response
+        self.fields = {
+            "cod": ("cod",),
+            "description": ("weather", 0, "description"),
+            "id": ("weather", 0, "id"),
+            "temp": ("main", "temp"),
+            "pressure": ("main", "pressure"),
+            "humidity": ("main", "humidity"),
+        }
 
-    def get(self):
+    def fetch(self):
         print("Getting weather")
-        WEATHER_data = self.ntw.request("GET", self.complete_url)
+        WEATHER_data = yield ("GET", self.complete_url, None, {}, self.fields)
         print("Weather response =", WEATHER_data)
 
-        if WEATHER_data is not None and WEATHER_data["cod"] != "404":
-            self.WEATHER_description = WEATHER_data["weather"][0]["description"]
-            self.WEATHER_id = WEATHER_data["weather"][0]["id"]
-            self.current_temperature = round(WEATHER_data["main"]["temp"] - 273.15)
-            self.current_pressure = WEATHER_data["main"]["pressure"]
-            self.current_humidity = WEATHER_data["main"]["humidity"]
+        if WEATHER_data is not None and len(WEATHER_data) == len(self.fields):
+            self.WEATHER_description = WEATHER_data["description"]
+            self.WEATHER_id = WEATHER_data["id"]
+            self.current_temperature = round(WEATHER_data["temp"] - 273.15)
+            self.current_pressure = WEATHER_data["pressure"]
+            self.current_humidity = WEATHER_data["humidity"]
 
             if self.WEATHER_id == 800:
                 self.pixel_art = "clear"
@@ -91,24 +103,18 @@ class Weather(Screen_element):
             self.pixel_art = "cross"
             result = False
 
-        temp_str = str(self.current_temperature)
-        y = 7
-        self.sc.set_memory(
-            name="WEATHER_art", elem_type="pixel", content=(0, y, self.pixel_art)
-        )
-        self.sc.set_memory(
-            name="WEATHER_temp", elem_type="str", content=(1, y, temp_str)
-        )
-        self.sc.set_memory(
-            name="WEATHER_temp_type",
-            elem_type="pixel",
-            content=(1 + len(temp_str), y, "celcius"),
-        )
-        self.sc.set_memory(
-            name="WEATHER_humidity",
-            elem_type="str",
-            content=(2 + len(temp_str), y, str(self.current_humidity) + "%"),
-        )
+        with self.sc.frame():
+            self.sc.set_widget("weather_art", self.pixel_art)
+            self.sc.set_widget("weather_temp", "%3d" % self.current_temperature)
+            self.sc.set_widget("weather_temp_type", "celcius")
+            self.sc.set_widget("weather_humidity", str(self.current_humidity) + "%")
+            # Weather page
+            self.sc.set_widget("forecast", self.WEATHER_description)
+            self.sc.set_widget("forecast_art", self.pixel_art)
+            self.sc.set_widget("forecast_temp", "%3d" % self.current_temperature)
+            self.sc.set_widget("forecast_type", "celcius")
+            self.sc.set_widget("pressure", str(self.current_pressure) + "hPa")
+            self.sc.set_widget("humidity", str(self.current_humidity) + "%")
         return result
 
 
@@ -122,35 +128,137 @@ def update_clock(sc):
         + ":"
         + "%02d" % localtime[5]
     )
-    sc.set_memory(
-        name="date", elem_type="str", content=(1, 0, time + " " + date), delete=True
-    )
+    with sc.frame():
+        sc.set_widget("date", date)
+        sc.set_widget("time", time)
 
 
-def main():
-    print("Running Ayon")
+def update_diagnostics(sc, ntw):
+    pool = sc.segments.stats()
+    if sc.flusher is not None:
+        flush = "flush %d/%d" % (sc.flusher.frames, sc.flusher.coalesced)
+    else:
+        flush = "flush sync"
+    with sc.frame():
+        sc.set_widget("diag_ip", ntw.ip[0] if ntw.ip is not None else "no ip")
+        sc.set_widget("diag_mem", "mem " + str(gc.mem_free()))
+        sc.set_widget(
+            "diag_pool",
+            "pool %d/%d/%d" % (pool["hits"], pool["misses"], pool["peak"]),
+        )
+        sc.set_widget("diag_flush", flush)
+
+
+def on_button(sc, button, kind):
+    if kind == BUTTON_PRESSED:
+        if button == const.BUTTON_NEXT_PAGE:
+            sc.next_page()
+        elif button == const.BUTTON_SCROLL:
+            sc.restart_marquees()
+
+
+def handle_buttons(sc, buttons):
+    event = buttons.get()
+    while event is not None:
+        on_button(sc, event[0], event[1])
+        event = buttons.get()
+
+
+def draw(sc, ntw, now, last_second):
+    # Returns the second the diagnostics were last drawn
+    with sc.frame():
+        update_clock(sc)
+        sc.set_widget(
+            "scroll_text",
+            "Hello world, this line is wider than the screen so it scrolls",
+        )
+        if now != last_second:
+            update_diagnostics(sc, ntw)
+            last_second = now
+    return last_second
+
+
+def time_to_wait(sc):
+    # Wake up for the next animation frame if it comes before the next cycle
+    wait = int(const.MAIN_CYCLE_TIME * 1000)
+    frame_wait = sc.time_to_next_frame()
+    if frame_wait is not None and frame_wait < wait:
+        wait = frame_wait
+    return wait
+
+
+def setup():
     sc = Screen_Handler()
     ntw = Network(sc, const.NTW_CHECK_TIME)
     clock = Clock(ntw, sc, const.CLOCK_TIME_CHECK)
     weather = Weather(ntw, sc, const.WEATHER_TIME_CHECK)
     # google = Google(ntw, sc, const.GOOGLE_TIME_CHECK)
+    buttons = None
+    if const.BUTTON_PINS:
+        buttons = Buttons(const.BUTTON_PINS, const.BUTTON_DEBOUNCE_MS)
+    return sc, ntw, (clock, weather), buttons
+
+
+def main():
+    print("Running Ayon")
+    sc, ntw, elements, buttons = setup()
 
     # scroll_text(sc)
+    last_second = 0
+    next_page_time = utime.time() + const.SCREEN_PAGE_TIME
     while True:
         now = utime.time()
         if ntw.check():
-            clock.check(now)
-            weather.check(now)
-        # google.check(now)
-        update_clock(sc)
-        sc.set_memory(
-            name="scroll_text",
-            elem_type="str",
-            content=(0, 2, "Hello world"),
-            scroll=True,
+            for element in elements:
+                element.check(now)
+        last_second = draw(sc, ntw, now, last_second)
+        if const.SCREEN_PAGE_TIME and now >= next_page_time:
+            sc.next_page()
+            next_page_time = now + const.SCREEN_PAGE_TIME
+        sc.update()
+
+        # Sleep, or wait for a button press and answer it before the
+        # network checks, which can block for a while
+        if buttons is not None:
+            if buttons.wait(time_to_wait(sc)):
+                handle_buttons(sc, buttons)
+        else:
+            utime.sleep_ms(time_to_wait(sc))
+
+
+async def screen_task(sc, ntw):
+    last_second = 0
+    next_page_time = utime.time() + const.SCREEN_PAGE_TIME
+    while True:
+        now = utime.time()
+        ntw.check()
+        last_second = draw(sc, ntw, now, last_second)
+        if const.SCREEN_PAGE_TIME and now >= next_page_time:
+            sc.next_page()
+            next_page_time = now + const.SCREEN_PAGE_TIME
+        sc.update()
+        await asyncio.sleep_ms(time_to_wait(sc))
+
+
+def main_async():
+    # Elements fetch in their own tasks, a slow request no longer stops the
+    # clock or the animations
+    print("Running Ayon with uasyncio")
+    sc, ntw, elements, buttons = setup()
+    loop = asyncio.get_event_loop()
+    sc.start_flusher(loop)
+    loop.create_task(screen_task(sc, ntw))
+    for element in elements:
+        loop.create_task(element.run())
+    if buttons is not None:
+        loop.create_task(
+            buttons.events(lambda button, kind: on_button(sc, button, kind))
         )
-        utime.sleep(const.MAIN_CYCLE_TIME)
+    loop.run_forever()
 
 
 if __name__ == "__main__":
-    main()
+    if const.MAIN_ASYNC:
+        main_async()
+    else:
+        main()